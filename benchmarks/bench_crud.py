@@ -0,0 +1,94 @@
+# File: benchmarks/bench_crud.py
+"""
+crud / utils 的 micro-benchmarks（直接呼叫函式，不經過 HTTP）。
+"""
+import itertools
+
+from server import crud
+from server.utils import get_current_version
+
+from .datagen import BASE_TS_MS, Dataset
+from .harness import Suite
+
+BATCH = 50
+
+
+def run(suite: Suite, ds: Dataset, session_factory) -> None:
+    counter = itertools.count()
+    _, device_id, _ = ds.devices[0]
+    exercise_id = ds.exercise_ids[0]
+
+    def new_id(prefix: str) -> str:
+        return f"bench-{prefix}-{next(counter):08d}"
+
+    def session_rows():
+        ts = BASE_TS_MS + next(counter)
+        return [
+            {"id": new_id("sess"), "startedAt": ts, "endedAt": None, "deletedAt": None,
+             "updatedAt": ts, "deviceId": device_id, "status": "in_progress"}
+            for _ in range(BATCH)
+        ]
+
+    def exercise_rows():
+        ts = BASE_TS_MS + next(counter)
+        return [
+            {"id": new_id("ex"), "name": "Bench", "defaultUnit": "kg", "updatedAt": ts,
+             "deviceId": device_id, "category": "other"}
+            for _ in range(BATCH)
+        ]
+
+    def set_rows():
+        ts = BASE_TS_MS + next(counter)
+        return [
+            {"id": new_id("set"), "sessionId": "bench-session", "exerciseId": exercise_id,
+             "weight": 60, "reps": 8, "unit": "kg", "createdAt": ts, "updatedAt": ts,
+             "deviceId": device_id}
+            for _ in range(BATCH)
+        ]
+
+    db = session_factory()
+    try:
+        suite.bench(f"upsert_sessions[insert x{BATCH}]", lambda: crud.upsert_sessions(db, session_rows()), repeat=10)
+        suite.bench(f"upsert_exercises[insert x{BATCH}]", lambda: crud.upsert_exercises(db, exercise_rows()), repeat=10)
+        suite.bench(f"upsert_sets[insert x{BATCH}]", lambda: crud.upsert_sets(db, set_rows()), repeat=10)
+
+        # 更新既有列：重複送同一批 id
+        fixed = set_rows()
+        suite.bench(f"upsert_sets[update x{BATCH}]", lambda: crud.upsert_sets(db, fixed), repeat=10)
+
+        cur = get_current_version(db)
+        suite.bench("get_current_version", lambda: get_current_version(db), repeat=50)
+        for tail in (100, 1000):
+            since = max(0, cur - tail)
+            suite.bench(
+                f"list_changes_since[tail {tail}]",
+                lambda since=since: crud.list_changes_since(db, since),
+                repeat=20,
+            )
+
+        busiest = _busiest_device(db)
+        suite.bench(
+            "get_recent_exercises[5 sessions]",
+            lambda: crud.get_recent_exercises(db, device_id=busiest, recent_sessions=5),
+            repeat=30,
+        )
+        suite.bench(
+            "get_recent_exercises[50 sessions]",
+            lambda: crud.get_recent_exercises(db, device_id=busiest, recent_sessions=50),
+            repeat=20,
+        )
+    finally:
+        db.close()
+
+
+def _busiest_device(db) -> str:
+    from sqlalchemy import func
+    from server import models
+
+    row = (
+        db.query(models.Session.deviceId, func.count())
+        .group_by(models.Session.deviceId)
+        .order_by(func.count().desc(), models.Session.deviceId)
+        .first()
+    )
+    return row[0]
@@ -0,0 +1,91 @@
+# File: benchmarks/bench_hiit.py
+"""
+HIIT in-memory 型錄的過濾 / 搜尋 benchmarks（直接呼叫 list_exercises），
+以及經 HTTP 的逐筆路由與 /api/hiit/batch/* 批次路由吞吐量對照。
+"""
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from server.hiit import router
+
+from .datagen import hiit_catalog
+from .harness import Suite
+
+# 型錄規模與資料規模脫鉤：HIIT 動作庫再大也是千筆等級
+CATALOG_SIZES = {"10k": 1_000, "100k": 10_000, "1m": 50_000}
+BATCH = 100
+
+
+def _list(**kw):
+    args = dict(q=None, category=None, equipment=None, bodyPart=None, goal=None,
+                status="no", limit=100, offset=0, sort="name")
+    args.update(kw)
+    return router.list_exercises(**args)
+
+
+def run(suite: Suite, scale: str, seed: int) -> None:
+    n = CATALOG_SIZES[scale]
+    saved = dict(router.DB["exercises"])
+    router.DB["exercises"].clear()
+    router.DB["exercises"].update(hiit_catalog(n, seed))
+    try:
+        suite.bench(f"hiit.list_exercises[all n={n}]", lambda: _list())
+        suite.bench(f"hiit.list_exercises[category n={n}]", lambda: _list(category="core"))
+        suite.bench(f"hiit.list_exercises[bodyPart+goal n={n}]", lambda: _list(bodyPart="腿", goal="耐力"))
+        suite.bench(f"hiit.list_exercises[q=name n={n}]", lambda: _list(q="move 0001"))
+        suite.bench(f"hiit.list_exercises[q=miss n={n}]", lambda: _list(q="zzz-not-found"))
+        suite.bench(f"hiit.list_exercises[sort=category n={n}]", lambda: _list(sort="category", limit=500))
+        suite.bench(f"hiit.list_exercises[status=with offset n={n}]",
+                    lambda: _list(status="with", offset=n // 2))
+    finally:
+        router.DB["exercises"].clear()
+        router.DB["exercises"].update(saved)
+    run_http(suite)
+
+
+def run_http(suite: Suite) -> None:
+    """同樣 BATCH 筆建立 / 更新 / 刪除：逐筆路由 vs. 批次路由（只掛 HIIT router，不經 DB）。"""
+    app = FastAPI()
+    app.include_router(router.hiit)
+    saved = {k: dict(v) for k, v in router.DB.items()}
+    payloads = [{"name": f"Bench {i:04d}", "primaryCategory": "core", "bodyPart": ["腹"]} for i in range(BATCH)]
+    try:
+        with TestClient(app) as client:
+            def single_create():
+                return [client.post("/api/hiit/exercises", json=p).json()["id"] for p in payloads]
+
+            def batch_create():
+                r = client.post("/api/hiit/batch/exercises", json={"items": payloads})
+                return [x["id"] for x in r.json()["results"]]
+
+            ids = batch_create()
+            suite.bench(f"hiit.http.create[single x{BATCH}]", single_create, repeat=5)
+            suite.bench(f"hiit.http.create[batch x{BATCH}]", batch_create, repeat=5)
+            suite.bench(
+                f"hiit.http.update[single x{BATCH}]",
+                lambda: [client.put(f"/api/hiit/exercises/{i}", json={"defaultValue": 40}) for i in ids],
+                repeat=5,
+            )
+            suite.bench(
+                f"hiit.http.update[batch x{BATCH}]",
+                lambda: client.put("/api/hiit/batch/exercises",
+                                   json={"items": [{"id": i, "defaultValue": 40} for i in ids]}),
+                repeat=5,
+            )
+            suite.bench(
+                f"hiit.http.delete+restore[single x{BATCH}]",
+                lambda: [(client.delete(f"/api/hiit/exercises/{i}"), client.post(f"/api/hiit/exercises/{i}/restore"))
+                         for i in ids],
+                repeat=5,
+            )
+            suite.bench(
+                f"hiit.http.delete+restore[batch x{BATCH}]",
+                lambda: (client.post("/api/hiit/batch/exercises/delete", json={"ids": ids}),
+                         client.post("/api/hiit/batch/exercises/restore", json={"ids": ids})),
+                repeat=5,
+            )
+    finally:
+        for k, v in saved.items():
+            router.DB[k].clear()
+            router.DB[k].update(v)
+
@@ -0,0 +1,170 @@
+# File: benchmarks/bench_shards.py
+"""
+分片寫入吞吐量：同樣的並發 push 負載，分別寫進 1 / 2 / 4 / 8 個 shard。
+
+每個 shard 各有一條 single-writer commit queue（server/writer.py），
+producer threads 模擬不同使用者的裝置，持續以 apply_changes 寫入 sessions + sets。
+報告每種分片數的 rows/s、push/s 與 push 延遲（p50 / p95）。
+
+預設所有 shard 在同一個 process（與 server 相同）；ORM 與 SQLite 呼叫的 CPU 部分受 GIL 限制，
+分片主要省下的是鎖等待與 fsync。--processes 讓每個 shard 在獨立 process 寫入，
+可量到多核心機器上的擴展上限。
+
+  python -m benchmarks.bench_shards                          # 預設 1,2,4,8 shards，各 5 秒
+  python -m benchmarks.bench_shards --shards 1,4 --producers 64 --duration 10 --out shards.json
+  python -m benchmarks.bench_shards --processes
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+
+def _rows(user: str, device: str, seq: int, sets_per_push: int):
+    from .datagen import BASE_TS_MS
+
+    ts = BASE_TS_MS + seq
+    sid = f"{device}-s{seq}"
+    sessions = [{"id": sid, "startedAt": ts, "updatedAt": ts, "deviceId": device, "status": "in_progress"}]
+    sets = [
+        {"id": f"{sid}-{i}", "sessionId": sid, "exerciseId": "bench-ex", "weight": 60, "reps": 8,
+         "unit": "kg", "createdAt": ts, "updatedAt": ts, "deviceId": device}
+        for i in range(sets_per_push)
+    ]
+    return sessions, sets
+
+
+def _drive(count: int, directory: str, shard_ids, producers: int, duration: float, sets_per_push: int) -> dict:
+    """在目前的 process 內對 shard_ids 這幾個 shard 施加寫入負載（只驅動 hash 到這些 shard 的使用者）。"""
+    from server.crud import apply_changes
+    from server.shards import ShardPool, shard_for
+    from server.writer import Writer
+
+    pool = ShardPool(count, directory, max_open=count)
+    writers = {i: Writer((lambda i=i: pool.session(i)), name=f"bench-writer-{i}") for i in shard_ids}
+    users = [n for n in range(producers) if shard_for(f"bench-user-{n:04d}", count) in writers]
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    out = {"rows": 0, "pushes": 0, "errors": 0, "latencies": []}
+
+    def producer(n: int) -> None:
+        user, device = f"bench-user-{n:04d}", f"bench-dev-{n:04d}"
+        w = writers[shard_for(user, count)]
+        seq, rows, pushes, errors, lat = 0, 0, 0, 0, []
+        while not stop.is_set():
+            seq += 1
+            sessions, sets = _rows(user, device, seq, sets_per_push)
+            t0 = time.perf_counter()
+            try:
+                w.call(apply_changes, sessions, [], sets, key=device)
+            except Exception:
+                errors += 1
+                continue
+            lat.append((time.perf_counter() - t0) * 1000.0)
+            rows += len(sessions) + len(sets)
+            pushes += 1
+        with lock:
+            out["rows"] += rows
+            out["pushes"] += pushes
+            out["errors"] += errors
+            out["latencies"].extend(lat)
+
+    threads = [threading.Thread(target=producer, args=(n,), daemon=True) for n in users]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    out["elapsed"] = time.perf_counter() - t0
+    for w in writers.values():
+        w.stop()
+    pool.dispose()
+    return out
+
+
+def run_one(count: int, producers: int, duration: float, sets_per_push: int, workdir: str,
+            processes: bool = False) -> dict:
+    from server.shards import ShardPool
+
+    from .harness import percentile
+
+    directory = os.path.join(workdir, f"shards-{count}")
+    pool = ShardPool(count, directory, max_open=count)
+    pool.check_manifest()
+    for i in range(count):
+        pool.sessionmaker(i)  # 先建表，避免把 create_all / migrations 算進吞吐量
+    pool.dispose()
+
+    if processes:
+        # 每個 shard 一個 process（相當於依 shard 分流的多 worker 部署），不受單一 process 的 GIL 限制
+        with ProcessPoolExecutor(max_workers=count) as ex:
+            parts = list(ex.map(
+                _drive, *zip(*[(count, directory, [i], producers, duration, sets_per_push) for i in range(count)])
+            ))
+    else:
+        parts = [_drive(count, directory, list(range(count)), producers, duration, sets_per_push)]
+
+    elapsed = max(p["elapsed"] for p in parts)
+    latencies = sorted(x for p in parts for x in p["latencies"])
+    rows = sum(p["rows"] for p in parts)
+    pushes = sum(p["pushes"] for p in parts)
+    return {
+        "shards": count,
+        "rowsPerSec": round(rows / elapsed, 1),
+        "pushesPerSec": round(pushes / elapsed, 1),
+        "errors": sum(p["errors"] for p in parts),
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+    }
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Write throughput vs. number of SQLite shards")
+    ap.add_argument("--shards", default="1,2,4,8", help="逗號分隔的分片數")
+    ap.add_argument("--producers", type=int, default=32, help="並發寫入的裝置（使用者）數")
+    ap.add_argument("--duration", type=float, default=5.0, help="每種分片數的量測秒數")
+    ap.add_argument("--sets-per-push", type=int, default=10)
+    ap.add_argument("--processes", action="store_true", help="每個 shard 在獨立 process 寫入（多核心機器上才看得出擴展性）")
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args(argv)
+
+    # 量的是寫入吞吐量；關掉慢查詢的 EXPLAIN 擷取，避免它本身干擾結果
+    os.environ.setdefault("SLOW_QUERY_MS", "60000")
+    sys.path.insert(0, ROOT)
+    workdir = tempfile.mkdtemp(prefix="bench-shards-")
+    results = []
+    try:
+        for count in [int(x) for x in args.shards.split(",") if x.strip()]:
+            r = run_one(count, args.producers, args.duration, args.sets_per_push, workdir, args.processes)
+            results.append(r)
+            print(f"[shards] {r['shards']:>2} shard(s): {r['rowsPerSec']:>9} rows/s  "
+                  f"{r['pushesPerSec']:>7} push/s  p50 {r['p50_ms']} ms  p95 {r['p95_ms']} ms  errors {r['errors']}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if results and results[0]["rowsPerSec"]:
+        base = results[0]["rowsPerSec"]
+        for r in results:
+            r["speedup"] = round(r["rowsPerSec"] / base, 2)
+        print("[shards] speedup vs %d shard(s): %s" % (
+            results[0]["shards"], ", ".join(f"{r['shards']}→{r['speedup']}x" for r in results)))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"producers": args.producers, "duration": args.duration, "processes": args.processes,
+                       "cpus": os.cpu_count(), "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+# File: benchmarks/bench_startup.py
+"""
+API server 冷啟動量測與 regression 檢查。
+
+  python -m benchmarks.bench_startup                      # 量測並與 startup baseline 比對（變慢超過容許值 exit 1）
+  python -m benchmarks.bench_startup --runs 10 --out startup.json
+  python -m benchmarks.bench_startup --update-baseline    # 以本次結果更新 baseline
+
+量測項目（每項重複 --runs 次取 median，每次都是全新的 python process）：
+- import server.app：`python -X importtime` 的總時間，並依頂層套件（fastapi / sqlalchemy / pydantic / server ...）
+  彙總 self time，另列出 server.* 中最慢的模組
+- first /health：從啟動 uvicorn process 到第一個 /health 回 200 的時間
+  （fresh db = 空 DB，需建表與套用所有 migrations；migrated db = 已是最新 schema 的 DB）
+- lifespan 各步驟：取自 server 的 /diagnostics/startup
+
+baseline 與機器有關，換機器或 CI runner 時請先以 --update-baseline 重新產生。
+與機器無關的啟動行為（import 不碰 DB / 不載 seed、lifespan 跑完所有步驟）見 tests/test_startup.py。
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from .harness import compare, load_baseline, summarize, update_baseline, write_results
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+DEFAULT_BASELINE = os.path.join(HERE, "startup_baseline.json")
+BASELINE_KEY = "startup"
+
+
+def _env(db_path: str) -> dict:
+    env = dict(os.environ)
+    env["SYNC_DATABASE_URL"] = f"sqlite:///{db_path}"
+    env["PYTHONPATH"] = ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# ---------- import time ----------
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """`-X importtime` 輸出 → [(module, self_us, cumulative_us)]。"""
+    out = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cum_us, name = (p.strip() for p in line[len("import time:"):].split("|"))
+        out.append((name, int(self_us), int(cum_us)))
+    return out
+
+
+def measure_import(db_path: str) -> Tuple[float, List[Tuple[str, int, int]]]:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server.app"],
+        cwd=ROOT, env=_env(db_path), capture_output=True, text=True, check=True,
+    )
+    rows = parse_importtime(proc.stderr)
+    total = next((cum for name, _, cum in rows if name == "server.app"), 0)
+    return total / 1000.0, rows
+
+
+def import_breakdown(rows: List[Tuple[str, int, int]], top: int = 8) -> Tuple[Dict[str, float], List[Tuple[str, float]]]:
+    """回傳（頂層套件 → self time 合計 ms，server.* 依 self time 排序的前 top 名）。"""
+    by_pkg: Dict[str, int] = defaultdict(int)
+    for name, self_us, _ in rows:
+        by_pkg[name.split(".")[0]] += self_us
+    packages = {k: round(v / 1000.0, 1) for k, v in sorted(by_pkg.items(), key=lambda kv: -kv[1])}
+    server = sorted(((n, s / 1000.0) for n, s, _ in rows if n == "server" or n.startswith("server.")), key=lambda x: -x[1])
+    return packages, [(n, round(ms, 1)) for n, ms in server[:top]]
+
+
+# ---------- time to first /health ----------
+def measure_first_health(db_path: str, timeout: float = 30.0) -> Tuple[float, dict]:
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server.app:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=ROOT, env=_env(db_path), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    try:
+        while True:
+            try:
+                with urllib.request.urlopen(url + "/health", timeout=1) as r:
+                    if r.status == 200:
+                        elapsed = (time.perf_counter() - t0) * 1000.0
+                        break
+            except (urllib.error.URLError, ConnectionError, OSError):
+                pass
+            if proc.poll() is not None:
+                raise RuntimeError(f"server exited before /health: {proc.stderr.read().decode()[-2000:]}")
+            if time.perf_counter() - t0 > timeout:
+                raise RuntimeError("timed out waiting for /health")
+            time.sleep(0.005)
+        try:
+            with urllib.request.urlopen(url + "/diagnostics/startup", timeout=5) as r:
+                phases = json.load(r).get("phases", {})
+        except urllib.error.HTTPError:
+            phases = {}  # 舊版 server 沒有這個端點（比對改版前後時）
+        return elapsed, phases
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        if proc.stderr:
+            proc.stderr.close()
+
+
+def run(runs: int, workdir: str) -> dict:
+    migrated = os.path.join(workdir, "migrated.db")
+    samples: Dict[str, List[float]] = defaultdict(list)
+    phases: Dict[str, List[float]] = defaultdict(list)
+    rows: List[Tuple[str, int, int]] = []
+
+    measure_first_health(migrated)  # 先建出已 migrate 的 DB（也順便預熱 .pyc）
+    for i in range(runs):
+        ms, rows = measure_import(migrated)
+        samples["import server.app"].append(ms)
+
+        fresh = os.path.join(workdir, f"fresh-{i}.db")
+        ms, _ = measure_first_health(fresh)
+        samples["first /health (fresh db)"].append(ms)
+
+        ms, ph = measure_first_health(migrated)
+        samples["first /health (migrated db)"].append(ms)
+        for k, v in ph.items():
+            phases[k].append(v)
+
+    packages, slowest = import_breakdown(rows)
+    results = {name: summarize(v) for name, v in samples.items()}
+    for k, v in phases.items():
+        results[f"startup.{k}"] = summarize(v)
+    return {"results": results, "importPackagesMs": packages, "importSlowestServerMs": slowest}
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="API server cold-start profile and regression check")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--baseline", default=DEFAULT_BASELINE)
+    ap.add_argument("--update-baseline", action="store_true")
+    ap.add_argument("--tolerance", type=float, default=0.5, help="容許變慢比例（0.5 = 50%%）")
+    ap.add_argument("--min-delta-ms", type=float, default=25.0, help="小於此差距不算 regression（過濾 process 啟動雜訊）")
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="bench-startup-")
+    try:
+        rep = run(args.runs, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results = rep["results"]
+    for name, r in results.items():
+        print(f"  {name:<36} median {r['median_ms']:>9.1f} ms   min {r['min_ms']:>9.1f} ms   max {r['max_ms']:>9.1f} ms")
+    print("[startup] import self time by package (ms): " + ", ".join(
+        f"{k} {v}" for k, v in list(rep["importPackagesMs"].items())[:8]))
+    print("[startup] slowest server modules (self ms): " + ", ".join(f"{n} {ms}" for n, ms in rep["importSlowestServerMs"]))
+
+    if args.out:
+        write_results(args.out, {"runs": args.runs, "python": sys.version.split()[0], **rep})
+    if args.update_baseline:
+        update_baseline(args.baseline, BASELINE_KEY, results)
+        print(f"[startup] baseline updated: {args.baseline}")
+        return 0
+
+    regressions = compare(load_baseline(args.baseline), BASELINE_KEY, results,
+                          tolerance=args.tolerance, min_delta_ms=args.min_delta_ms)
+    for line in regressions:
+        print(f"[startup] REGRESSION {line}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
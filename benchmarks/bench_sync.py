@@ -0,0 +1,105 @@
+# File: benchmarks/bench_sync.py
+"""
+端對端 /sync 計時：經過 ASGI TestClient（含 pydantic 驗證、序列化、middleware）。
+"""
+import itertools
+
+from fastapi.testclient import TestClient
+
+from .datagen import BASE_TS_MS, Dataset
+from .harness import Suite
+
+PUSH_SETS = 20
+
+
+def count_statements(fn) -> int:
+    """fn 執行期間送到 DB 的 SQL 敘述數（含 commit queue 的 writer thread）。"""
+    from sqlalchemy import event
+
+    from server.database import engine
+
+    n = [0]
+
+    def _count(*_):
+        n[0] += 1
+
+    event.listen(engine, "before_cursor_execute", _count)
+    try:
+        fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", _count)
+    return n[0]
+
+
+def run(suite: Suite, ds: Dataset) -> None:
+    from server.app import app
+
+    _, device_id, token = ds.devices[-1]
+    exercise_id = ds.exercise_ids[-1]
+    counter = itertools.count()
+
+    def push_body(last_version: int) -> dict:
+        ts = BASE_TS_MS + next(counter)
+        sid = f"bench-sync-sess-{next(counter):08d}"
+        return {
+            "deviceId": device_id,
+            "token": token,
+            "lastVersion": last_version,
+            "changes": {
+                "sessions": [{"id": sid, "startedAt": ts, "updatedAt": ts, "deviceId": device_id}],
+                "sets": [
+                    {"id": f"bench-sync-set-{next(counter):08d}", "sessionId": sid,
+                     "exerciseId": exercise_id, "weight": 50, "reps": 10, "unit": "kg",
+                     "createdAt": ts, "updatedAt": ts, "deviceId": device_id}
+                    for _ in range(PUSH_SETS)
+                ],
+            },
+        }
+
+    with TestClient(app) as client:
+        def current_version() -> int:
+            return client.get("/health").json()["serverVersion"]
+
+        def post(body: dict) -> dict:
+            r = client.post("/sync", json=body)
+            r.raise_for_status()
+            return r.json()
+
+        cur = current_version()
+        suite.bench("http./health", lambda: client.get("/health").raise_for_status(), repeat=30)
+        suite.bench(
+            "http./sync[pull-only, up to date]",
+            lambda: post({"deviceId": device_id, "token": token, "lastVersion": cur}),
+            repeat=30,
+        )
+        suite.bench(
+            "http./sync[pull-only, tail 100]",
+            lambda: post({"deviceId": device_id, "token": token, "lastVersion": max(0, cur - 100)}),
+            repeat=20,
+        )
+        # 對照組：關閉 pull 回應快取（每次都查三張表並重新序列化）
+        from server.pullcache import pull_cache
+        saved, pull_cache.max_bytes = pull_cache.max_bytes, 0
+        try:
+            suite.bench(
+                "http./sync[pull-only, tail 100, no cache]",
+                lambda: post({"deviceId": device_id, "token": token, "lastVersion": max(0, cur - 100)}),
+                repeat=20,
+            )
+        finally:
+            pull_cache.max_bytes = saved
+
+        # 模擬客戶端：每次以上次回傳的 serverVersion 當作 lastVersion
+        state = {"v": cur}
+
+        def push_pull() -> None:
+            state["v"] = post(push_body(state["v"]))["serverVersion"]
+
+        suite.bench(f"http./sync[push {PUSH_SETS + 1} rows + pull]", push_pull, repeat=10)
+
+        # 每個 request 的 SQL 敘述數：已是最新的裝置 push + pull、落後 100 個版本的裝置 push + pull
+        suite.count(f"sql./sync[push {PUSH_SETS + 1} rows + pull]", count_statements(push_pull))
+        def push_pull_behind() -> None:
+            state["v"] = post(push_body(max(0, state["v"] - 100)))["serverVersion"]
+
+        suite.count(f"sql./sync[push {PUSH_SETS + 1} rows + pull, 100 behind]", count_statements(push_pull_behind))
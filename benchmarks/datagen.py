@@ -0,0 +1,229 @@
+# File: benchmarks/datagen.py
+"""
+可重現的合成資料產生器（固定 seed → 每次產生完全相同的資料）。
+
+規模以 sets 筆數計：
+  10k  → 10,000 sets / 1,000 sessions / 100 exercises
+  100k → 100,000 sets / 10,000 sessions / 1,000 exercises
+  1m   → 1,000,000 sets / 100,000 sessions / 10,000 exercises
+每 2,000 筆 sets 一位使用者、每位使用者 2 台裝置（各自一組 token）。
+"""
+import json
+import os
+import random
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+from sqlalchemy import create_engine, func, select
+
+SCALES: Dict[str, int] = {
+    "10k": 10_000,
+    "100k": 100_000,
+    "1m": 1_000_000,
+}
+
+BASE_TS_MS = 1_700_000_000_000  # 固定起點，避免結果隨執行時間變動
+INSERT_CHUNK = 5_000
+
+CATEGORIES = ("upper", "lower", "core", "other")
+UNITS = ("kg", "lb", "sec", "min")
+HIIT_CATEGORIES = ("cardio", "lower", "upper", "core", "full")
+SEED_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "server", "hiit", "seed_exercises.json",
+)
+
+
+@dataclass
+class Dataset:
+    path: str
+    url: str
+    scale: str
+    seed: int
+    # (user_id, device_id, token)
+    devices: List[Tuple[str, str, str]] = field(default_factory=list)
+    exercise_ids: List[str] = field(default_factory=list)
+    max_version: int = 0
+
+
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _rows_for(scale: str, seed: int):
+    """依 scale 產生所有資料列（generator；不一次放進記憶體）。"""
+    n_sets = SCALES[scale]
+    n_sessions = max(1, n_sets // 10)
+    n_exercises = max(20, n_sets // 100)
+    n_users = max(1, n_sets // 2_000)
+
+    rng = random.Random(seed)
+    users = [_uuid(rng) for _ in range(n_users)]
+    devices = [(u, _uuid(rng), _uuid(rng)) for u in users for _ in range(2)]
+
+    yield "users", [{"id": u} for u in users]
+    yield "devices", [{"id": d, "user_id": u} for u, d, _ in devices]
+    yield "tokens", [{"token": t, "user_id": u, "device_id": d} for u, d, t in devices]
+
+    version = 0
+    ts = BASE_TS_MS
+    exercise_ids = []
+    ex_rows = []
+    for i in range(n_exercises):
+        version += 1
+        ts += 1_000
+        eid = _uuid(rng)
+        exercise_ids.append(eid)
+        unit = rng.choice(UNITS)
+        ex_rows.append({
+            "id": eid,
+            "name": f"Exercise {i:05d}",
+            "defaultWeight": rng.randint(5, 120) if unit in ("kg", "lb") else None,
+            "defaultReps": rng.randint(5, 15),
+            "defaultUnit": unit,
+            "isFavorite": rng.random() < 0.1,
+            "sortOrder": i,
+            "deletedAt": ts if rng.random() < 0.02 else None,
+            "updatedAt": ts,
+            "deviceId": rng.choice(devices)[1],
+            "version": version,
+            "category": rng.choice(CATEGORIES),
+        })
+    yield "exercises", ex_rows
+
+    # sessions 與其 sets 交錯遞增 version，貼近實際同步順序
+    sets_left = n_sets
+    sess_buf, set_buf = [], []
+    for i in range(n_sessions):
+        per = sets_left // (n_sessions - i)
+        sets_left -= per
+        ts += rng.randint(3_600_000, 86_400_000) // max(1, n_users)
+        _, device_id, _ = rng.choice(devices)
+        version += 1
+        sid = _uuid(rng)
+        ended = rng.random() < 0.95
+        sess_buf.append({
+            "id": sid,
+            "startedAt": ts,
+            "endedAt": ts + 3_000_000 if ended else None,
+            "deletedAt": ts if rng.random() < 0.01 else None,
+            "updatedAt": ts + 3_000_000,
+            "deviceId": device_id,
+            "version": version,
+            "status": "ended" if ended else "in_progress",
+        })
+        for j in range(per):
+            version += 1
+            unit = rng.choice(UNITS)
+            set_buf.append({
+                "id": _uuid(rng),
+                "sessionId": sid,
+                "exerciseId": rng.choice(exercise_ids),
+                "weight": rng.randint(0, 150),
+                "reps": rng.randint(1, 20),
+                "unit": unit,
+                "rpe": rng.randint(5, 10) if rng.random() < 0.3 else None,
+                "createdAt": ts + j * 60_000,
+                "deletedAt": ts if rng.random() < 0.01 else None,
+                "updatedAt": ts + j * 60_000,
+                "deviceId": device_id,
+                "version": version,
+            })
+        if len(set_buf) >= INSERT_CHUNK:
+            yield "sessions", sess_buf
+            yield "sets", set_buf
+            sess_buf, set_buf = [], []
+    if sess_buf or set_buf:
+        yield "sessions", sess_buf
+        yield "sets", set_buf
+
+
+def build_database(path: str, scale: str, seed: int = 42) -> Dataset:
+    """
+    在 path 建立 SQLite 資料庫並填入合成資料；若檔案已存在則直接重用。
+    回傳 Dataset（裝置 / token 等從 DB 讀回，確保與檔案內容一致）。
+    """
+    if scale not in SCALES:
+        raise ValueError(f"unknown scale: {scale} (choose from {', '.join(SCALES)})")
+
+    from server.database import Base
+    from server import models
+
+    url = f"sqlite:///{path}"
+    engine = create_engine(url)
+    try:
+        if not os.path.exists(path):
+            tmp_path = path + ".tmp"
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            tmp_engine = create_engine(f"sqlite:///{tmp_path}")
+            Base.metadata.create_all(bind=tmp_engine)
+            tables = Base.metadata.tables
+            with tmp_engine.begin() as conn:
+                for table, rows in _rows_for(scale, seed):
+                    for k in range(0, len(rows), INSERT_CHUNK):
+                        conn.execute(tables[table].insert(), rows[k:k + INSERT_CHUNK])
+            tmp_engine.dispose()
+            os.replace(tmp_path, path)
+
+        with engine.connect() as conn:
+            devices = [
+                (r.user_id, r.device_id, r.token)
+                for r in conn.execute(
+                    select(models.Token.user_id, models.Token.device_id, models.Token.token)
+                    .order_by(models.Token.user_id, models.Token.device_id)
+                )
+            ]
+            exercise_ids = list(
+                conn.execute(select(models.Exercise.id).order_by(models.Exercise.sortOrder)).scalars()
+            )
+            max_version = max(
+                conn.execute(select(func.max(m.version))).scalar() or 0
+                for m in (models.Session, models.Exercise, models.SetRecord)
+            )
+    finally:
+        engine.dispose()
+
+    return Dataset(
+        path=path, url=url, scale=scale, seed=seed,
+        devices=devices, exercise_ids=exercise_ids, max_version=max_version,
+    )
+
+
+# ---------- HIIT catalog ----------
+def _hiit_vocab() -> Dict[str, List[str]]:
+    """從 seed_exercises.json 取詞彙，讓合成資料的分佈接近真實型錄。"""
+    with open(SEED_PATH, "r", encoding="utf-8") as f:
+        items = json.load(f)
+    vocab: Dict[str, set] = {k: set() for k in ("equipment", "bodyPart", "trainingGoal", "movementType")}
+    for it in items:
+        vocab["equipment"].add(it.get("equipment") or "無")
+        for k in ("bodyPart", "trainingGoal", "movementType"):
+            vocab[k].update(it.get(k) or [])
+    return {k: sorted(v) for k, v in vocab.items()}
+
+
+def hiit_catalog(n: int, seed: int = 42) -> Dict[str, dict]:
+    """產生 n 筆 HIIT exercises（形狀同 router.HiitExercise.model_dump()），以 id 為鍵。"""
+    rng = random.Random(seed)
+    vocab = _hiit_vocab()
+    out: Dict[str, dict] = {}
+    for i in range(n):
+        eid = _uuid(rng)
+        out[eid] = {
+            "id": eid,
+            "name": f"Move {i:05d}\n動作 {i:05d}",
+            "primaryCategory": rng.choice(HIIT_CATEGORIES),
+            "defaultMode": "time",
+            "defaultValue": rng.choice((20, 30, 40, 45, 60)),
+            "movementType": rng.sample(vocab["movementType"], 1),
+            "trainingGoal": rng.sample(vocab["trainingGoal"], 2),
+            "equipment": rng.choice(vocab["equipment"]),
+            "bodyPart": rng.sample(vocab["bodyPart"], 2),
+            "cue": f"cue {rng.randint(0, 9999)} 保持核心穩定",
+            "coachNote": f"note {rng.randint(0, 9999)} 落地柔軟吸震",
+            "isBilateral": rng.random() < 0.8,
+            "deletedAt": "2025-01-01T00:00:00" if rng.random() < 0.05 else None,
+        }
+    return out
@@ -0,0 +1,126 @@
+# File: benchmarks/harness.py
+"""
+計時 / 結果輸出 / baseline 比對的共用工具。
+"""
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+def measure(fn: Callable[[], Any], repeat: int = 20, warmup: int = 2) -> Dict[str, float]:
+    """重複執行 fn，回傳毫秒統計（median / p95 / min / mean）。"""
+    for _ in range(warmup):
+        fn()
+    samples: List[float] = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    stats = summarize(samples)
+    del stats["p99_ms"], stats["max_ms"]
+    return stats
+
+
+def percentile(sorted_samples: List[float], q: float) -> float:
+    """最近秩（nearest-rank）百分位；sorted_samples 需已排序。"""
+    if not sorted_samples:
+        return 0.0
+    idx = min(len(sorted_samples) - 1, int(round(q * (len(sorted_samples) - 1))))
+    return sorted_samples[idx]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """毫秒樣本 → n / min / median / p95 / p99 / max / mean。"""
+    s = sorted(samples)
+    if not s:
+        return {"n": 0}
+    return {
+        "n": len(s),
+        "min_ms": round(s[0], 4),
+        "median_ms": round(statistics.median(s), 4),
+        "p95_ms": round(percentile(s, 0.95), 4),
+        "p99_ms": round(percentile(s, 0.99), 4),
+        "max_ms": round(s[-1], 4),
+        "mean_ms": round(statistics.fmean(s), 4),
+    }
+
+
+class Suite:
+    """收集單次執行的所有 benchmark 結果。"""
+
+    def __init__(self, scale: str, seed: int):
+        self.scale = scale
+        self.seed = seed
+        self.results: Dict[str, Dict[str, float]] = {}
+        self.counts: Dict[str, int] = {}
+
+    def bench(self, name: str, fn: Callable[[], Any], repeat: int = 20, warmup: int = 2) -> None:
+        self.results[name] = stats = measure(fn, repeat=repeat, warmup=warmup)
+        print(f"  {name:<48} median {stats['median_ms']:>10.3f} ms   p95 {stats['p95_ms']:>10.3f} ms")
+
+    def count(self, name: str, value: int) -> None:
+        """非時間類的量測（例如每個 request 的 SQL 敘述數）；只輸出，不與 baseline 比對。"""
+        self.counts[name] = value
+        print(f"  {name:<48} {value:>10d}")
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "meta": {
+                "scale": self.scale,
+                "seed": self.seed,
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "ts": int(time.time()),
+            },
+            "results": self.results,
+            "counts": self.counts,
+        }
+
+
+def write_results(path: str, data: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+def load_baseline(path: str) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def update_baseline(path: str, scale: str, results: Dict[str, Dict[str, float]]) -> None:
+    """baseline 以 scale 分組，只保存 median_ms（比對用）。"""
+    data = load_baseline(path)
+    data[scale] = {name: {"median_ms": r["median_ms"]} for name, r in sorted(results.items())}
+    write_results(path, data)
+
+
+def compare(
+    baseline: Dict[str, Any],
+    scale: str,
+    results: Dict[str, Dict[str, float]],
+    tolerance: float = 0.5,
+    min_delta_ms: float = 0.2,
+) -> List[str]:
+    """
+    回傳 regression 清單：median 比 baseline 慢超過 tolerance（比例），
+    且差距大於 min_delta_ms（過濾次毫秒級的雜訊）。
+    """
+    base: Optional[Dict[str, Any]] = baseline.get(scale)
+    if not base:
+        return []
+    out = []
+    for name, r in sorted(results.items()):
+        b = base.get(name)
+        if not b:
+            continue
+        cur, ref = r["median_ms"], b["median_ms"]
+        if cur > ref * (1.0 + tolerance) and cur - ref > min_delta_ms:
+            out.append(f"{name}: {cur:.3f} ms vs baseline {ref:.3f} ms (+{(cur / ref - 1) * 100:.0f}%)")
+    return out
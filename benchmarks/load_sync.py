@@ -0,0 +1,260 @@
+# File: benchmarks/load_sync.py
+"""
+多裝置併發同步壓測（asyncio）。
+
+  python -m benchmarks.load_sync --devices 200 --duration 30              # in-process app（暫存 DB）
+  python -m benchmarks.load_sync --devices 200 --target http://127.0.0.1:8000   # 打本機 uvicorn
+
+流程：
+  1) 每位使用者經 /auth/register-device 註冊第一台裝置，其餘裝置以 /auth/attach-device 綁定同一 userId
+  2) 每台裝置循環：思考時間 → 依權重挑一個動作
+       push  : /sync 上傳 1 筆 session + 1~5 筆 sets，並拉回 lastVersion 之後的變更
+       pull  : /sync 只拉不推
+       recent: /exercises/recent
+       continue: /sessions/continue
+  3) 報告 throughput、各端點 p50/p95/p99、錯誤（SQLite locked / 連線池用盡皆為 503）、裝置版本落後量
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+ACTIONS = (("push", 0.60), ("pull", 0.25), ("recent", 0.10), ("continue", 0.05))
+
+
+@dataclass
+class DeviceState:
+    user_id: str
+    device_id: str
+    token: str
+    rng: random.Random
+    last_version: int = 0
+    session_id: Optional[str] = None
+    seq: int = 0
+
+
+@dataclass
+class Stats:
+    latencies: Dict[str, List[float]] = field(default_factory=lambda: defaultdict(list))
+    status: Dict[str, Dict[str, int]] = field(default_factory=lambda: defaultdict(lambda: defaultdict(int)))
+    locked: int = 0
+    busy: int = 0
+    throttled: int = 0
+    errors: int = 0
+    max_version: int = 0
+    lag_samples: List[int] = field(default_factory=list)
+
+    def record(self, op: str, ms: float, status: int) -> None:
+        self.latencies[op].append(ms)
+        self.status[op][str(status)] += 1
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+async def _call(client: httpx.AsyncClient, stats: Stats, op: str, method: str, url: str, **kw):
+    t0 = time.perf_counter()
+    try:
+        r = await client.request(method, url, **kw)
+    except httpx.HTTPError:
+        stats.errors += 1
+        stats.record(op, (time.perf_counter() - t0) * 1000.0, 0)
+        return None
+    stats.record(op, (time.perf_counter() - t0) * 1000.0, r.status_code)
+    if r.status_code == 503:
+        if "locked" in r.text:
+            stats.locked += 1
+        else:
+            stats.busy += 1
+    elif r.status_code == 429:
+        stats.throttled += 1
+    elif r.status_code >= 500:
+        stats.errors += 1
+    return r
+
+
+async def _register(client: httpx.AsyncClient, stats: Stats, n_devices: int, per_user: int, seed: int):
+    devices: List[DeviceState] = []
+    user_id = None
+    for i in range(n_devices):
+        if i % per_user == 0:
+            r = await _call(client, stats, "register", "POST", "/auth/register-device", json={})
+        else:
+            r = await _call(client, stats, "attach", "POST", "/auth/attach-device", json={"userId": user_id})
+        if r is None or r.status_code != 200:
+            raise RuntimeError(f"device registration failed: {None if r is None else r.text}")
+        body = r.json()
+        user_id = body["userId"]
+        devices.append(DeviceState(
+            user_id=body["userId"], device_id=body["deviceId"], token=body["token"],
+            rng=random.Random(seed + i),
+        ))
+    return devices
+
+
+def _push_changes(dev: DeviceState) -> dict:
+    ts = _now_ms()
+    dev.seq += 1
+    if dev.session_id is None or dev.rng.random() < 0.1:
+        dev.session_id = f"{dev.device_id}-s{dev.seq}"
+    sid = dev.session_id
+    return {
+        "sessions": [{"id": sid, "startedAt": ts, "updatedAt": ts, "deviceId": dev.device_id}],
+        "sets": [
+            {"id": f"{sid}-z{dev.seq}-{k}", "sessionId": sid, "exerciseId": f"ex-{dev.rng.randint(1, 30)}",
+             "weight": dev.rng.randint(10, 100), "reps": dev.rng.randint(5, 12), "unit": "kg",
+             "createdAt": ts, "updatedAt": ts, "deviceId": dev.device_id}
+            for k in range(dev.rng.randint(1, 5))
+        ],
+    }
+
+
+async def _device_loop(client, stats: Stats, dev: DeviceState, deadline: float, think_s: float):
+    names = [a for a, _ in ACTIONS]
+    weights = [w for _, w in ACTIONS]
+    while time.monotonic() < deadline:
+        await asyncio.sleep(dev.rng.expovariate(1.0 / think_s) if think_s > 0 else 0)
+        op = dev.rng.choices(names, weights)[0]
+        if op in ("push", "pull"):
+            body = {"deviceId": dev.device_id, "token": dev.token, "lastVersion": dev.last_version}
+            if op == "push":
+                body["changes"] = _push_changes(dev)
+            r = await _call(client, stats, op, "POST", "/sync", json=body)
+            if r is not None and r.status_code == 200:
+                v = r.json()["serverVersion"]
+                dev.last_version = max(dev.last_version, v)
+                stats.max_version = max(stats.max_version, v)
+        elif op == "recent":
+            await _call(client, stats, op, "GET", "/exercises/recent",
+                        params={"deviceId": dev.device_id, "token": dev.token, "limitSessions": 5})
+        else:
+            await _call(client, stats, op, "POST", "/sessions/continue",
+                        json={"deviceId": dev.device_id, "token": dev.token})
+
+
+async def _lag_sampler(stats: Stats, devices: List[DeviceState], deadline: float, every_s: float = 0.5):
+    """定期取樣：全域已知最大版本 − 各裝置 lastVersion。"""
+    while time.monotonic() < deadline:
+        await asyncio.sleep(every_s)
+        top = stats.max_version
+        stats.lag_samples.extend(top - d.last_version for d in devices)
+
+
+async def run_load(client: httpx.AsyncClient, args) -> dict:
+    from .harness import percentile, summarize
+
+    stats = Stats()
+    devices = await _register(client, stats, args.devices, args.devices_per_user, args.seed)
+    # 註冊階段不計入負載統計
+    reg = {op: summarize(stats.latencies.pop(op)) for op in ("register", "attach") if op in stats.latencies}
+    stats.status.pop("register", None)
+    stats.status.pop("attach", None)
+
+    t0 = time.monotonic()
+    deadline = t0 + args.duration
+    await asyncio.gather(
+        _lag_sampler(stats, devices, deadline),
+        *(_device_loop(client, stats, d, deadline, args.think) for d in devices),
+    )
+    elapsed = time.monotonic() - t0
+
+    final_lag = sorted(stats.max_version - d.last_version for d in devices)
+    lag = sorted(stats.lag_samples)
+    total = sum(len(v) for v in stats.latencies.values())
+    return {
+        "config": {
+            "devices": args.devices, "devicesPerUser": args.devices_per_user,
+            "duration": args.duration, "think": args.think, "target": args.target or "in-process",
+        },
+        "elapsedSec": round(elapsed, 3),
+        "requests": total,
+        "throughputRps": round(total / elapsed, 2) if elapsed else 0.0,
+        "sqliteLocked": stats.locked,
+        "poolBusy": stats.busy,
+        "throttled": stats.throttled,
+        "errors": stats.errors,
+        "registration": reg,
+        "latency": {op: summarize(v) for op, v in sorted(stats.latencies.items())},
+        "status": {op: dict(v) for op, v in sorted(stats.status.items())},
+        "versionLag": {
+            "serverVersion": stats.max_version,
+            "sampledP50": percentile(lag, 0.50),
+            "sampledP95": percentile(lag, 0.95),
+            "sampledMax": lag[-1] if lag else 0,
+            "finalP50": percentile(final_lag, 0.50),
+            "finalMax": final_lag[-1] if final_lag else 0,
+        },
+    }
+
+
+async def _main_async(args) -> dict:
+    limits = httpx.Limits(max_connections=args.devices, max_keepalive_connections=args.devices)
+    timeout = httpx.Timeout(args.timeout)
+    if args.target:
+        async with httpx.AsyncClient(base_url=args.target, limits=limits, timeout=timeout) as client:
+            return await run_load(client, args)
+
+    # in-process：需在 import server.* 前指定 DB 位置
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix="loadgen-"), "sync.db")
+    os.environ["SYNC_DATABASE_URL"] = f"sqlite:///{db_path}"
+    sys.path.insert(0, ROOT)
+    from server.app import app
+
+    print(f"[load] in-process app, db={db_path}")
+    # 未處理的例外轉成 500 回應（與真正的 HTTP server 一致），不直接拋給壓測端
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadgen",
+                                     limits=limits, timeout=timeout) as client:
+            return await run_load(client, args)
+
+
+def _print_report(rep: dict) -> None:
+    print(f"[load] {rep['requests']} requests in {rep['elapsedSec']}s "
+          f"→ {rep['throughputRps']} req/s, sqlite locked={rep['sqliteLocked']}, "
+          f"pool busy={rep['poolBusy']}, throttled={rep['throttled']}, errors={rep['errors']}")
+    print(f"  {'op':<10}{'n':>8}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}{'max ms':>12}  status")
+    for op, s in rep["latency"].items():
+        print(f"  {op:<10}{s['n']:>8}{s['median_ms']:>12.2f}{s['p95_ms']:>12.2f}"
+              f"{s['p99_ms']:>12.2f}{s['max_ms']:>12.2f}  {rep['status'].get(op)}")
+    lag = rep["versionLag"]
+    print(f"  version lag: sampled p50={lag['sampledP50']} p95={lag['sampledP95']} max={lag['sampledMax']}; "
+          f"final p50={lag['finalP50']} max={lag['finalMax']} (serverVersion={lag['serverVersion']})")
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Concurrent multi-device load generator for /sync")
+    ap.add_argument("--devices", type=int, default=100)
+    ap.add_argument("--devices-per-user", type=int, default=2)
+    ap.add_argument("--duration", type=float, default=20.0, help="秒")
+    ap.add_argument("--think", type=float, default=0.5, help="平均思考時間（秒，指數分佈）")
+    ap.add_argument("--timeout", type=float, default=30.0)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--target", default=None, help="例如 http://127.0.0.1:8000；省略則 in-process")
+    ap.add_argument("--db", default=None, help="in-process 模式使用的 SQLite 檔（預設暫存檔）")
+    ap.add_argument("--out", default=None, help="輸出 JSON 報告")
+    args = ap.parse_args(argv)
+
+    rep = asyncio.run(_main_async(args))
+    _print_report(rep)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(rep, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+# File: benchmarks/run.py
+"""
+Benchmark 入口：
+
+  python -m benchmarks.run --scale 10k                      # 執行並與 baseline 比對
+  python -m benchmarks.run --scale 100k --out out.json      # 指定結果輸出
+  python -m benchmarks.run --scale 10k --update-baseline    # 以本次結果更新 baseline
+
+合成資料會快取在 --cache-dir（預設 .bench-cache/），每次執行複製一份工作用 DB，
+避免 upsert 類 benchmark 影響下一次執行。有 regression 時 exit code = 1。
+"""
+import argparse
+import os
+import shutil
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+DEFAULT_BASELINE = os.path.join(HERE, "baseline.json")
+DEFAULT_CACHE = os.path.join(ROOT, ".bench-cache")
+
+GROUPS = ("crud", "hiit", "sync")
+
+
+def main(argv=None) -> int:
+    from .datagen import SCALES
+
+    ap = argparse.ArgumentParser(description="Workout Notes server benchmarks")
+    ap.add_argument("--scale", choices=list(SCALES), default="10k")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--only", choices=GROUPS, action="append", help="只跑指定群組（可重複）")
+    ap.add_argument("--out", default=None, help="結果 JSON（預設 .bench-cache/results-<scale>.json）")
+    ap.add_argument("--baseline", default=DEFAULT_BASELINE)
+    ap.add_argument("--update-baseline", action="store_true")
+    ap.add_argument("--tolerance", type=float, default=0.5, help="容許變慢比例（0.5 = 50%%）")
+    ap.add_argument("--cache-dir", default=DEFAULT_CACHE)
+    args = ap.parse_args(argv)
+
+    os.makedirs(args.cache_dir, exist_ok=True)
+    src = os.path.join(args.cache_dir, f"bench-{args.scale}-s{args.seed}.db")
+    work = os.path.join(args.cache_dir, f"work-{args.scale}.db")
+
+    # 必須在 import server.* 之前設定，server.database 會在 import 時讀取
+    os.environ["SYNC_DATABASE_URL"] = f"sqlite:///{work}"
+    # 同一裝置連續呼叫數百次：量的是處理成本，不是准入控制
+    os.environ.setdefault("ADMIT_ENABLED", "0")
+    sys.path.insert(0, ROOT)
+
+    from .datagen import build_database
+    from .harness import Suite, compare, load_baseline, update_baseline, write_results
+
+    t0 = time.perf_counter()
+    build_database(src, args.scale, args.seed)
+    print(f"[bench] dataset {args.scale} ready in {time.perf_counter() - t0:.1f}s: {src}")
+    for stale in (work, work + "-wal", work + "-shm"):
+        if os.path.exists(stale):
+            os.remove(stale)
+    shutil.copyfile(src, work)
+    ds = build_database(work, args.scale, args.seed)
+
+    from server.database import SessionLocal, engine
+    from server.migrate import run_migrations
+
+    run_migrations(engine)
+
+    groups = args.only or list(GROUPS)
+    suite = Suite(args.scale, args.seed)
+    if "crud" in groups:
+        from . import bench_crud
+        print("[bench] crud")
+        bench_crud.run(suite, ds, SessionLocal)
+    if "hiit" in groups:
+        from . import bench_hiit
+        print("[bench] hiit")
+        bench_hiit.run(suite, args.scale, args.seed)
+    if "sync" in groups:
+        from . import bench_sync
+        print("[bench] sync")
+        bench_sync.run(suite, ds)
+
+    out = args.out or os.path.join(args.cache_dir, f"results-{args.scale}.json")
+    write_results(out, suite.to_json())
+    print(f"[bench] results -> {out}")
+
+    if args.update_baseline:
+        update_baseline(args.baseline, args.scale, suite.results)
+        print(f"[bench] baseline updated -> {args.baseline}")
+        return 0
+
+    regressions = compare(load_baseline(args.baseline), args.scale, suite.results, args.tolerance)
+    if regressions:
+        print("[bench] REGRESSIONS:")
+        for line in regressions:
+            print("  " + line)
+        return 1
+    print("[bench] no regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
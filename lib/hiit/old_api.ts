@@ -158,4 +158,66 @@ export async function deleteWorkout(id: string, hard = false) {
   const url = new URL(`/api/hiit/workouts/${encodeURIComponent(id)}`, base);
   if (hard) url.searchParams.set('hard', 'true');
   return j(url.toString(), { method: 'DELETE' });
-}
\ No newline at end of file
+}
+/* =========================
+ *     Batch（一次多筆）
+ * ========================= */
+
+export type HiitBatchResult = {
+  ok: boolean;
+  applied: number;
+  // status：201 建立 / 200 成功 / 404 不存在 / 409 同批重複 / 422 驗證失敗 / 424 整批中止未套用
+  results: Array<{ index: number; status: number; id?: string; error?: string; item?: any }>;
+};
+
+/** 批次路由：422 代表整批未套用，仍回傳逐筆結果讓呼叫端顯示 */
+async function jBatch(path: string, method: 'POST' | 'PUT', body: unknown): Promise<HiitBatchResult> {
+  const base = ensureBaseOrThrow();
+  const r = await fetch(`${base}/api/hiit/batch/${path}`, {
+    method, headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(body),
+  });
+  if (r.ok || r.status === 422) {
+    const data = await r.json().catch(() => null);
+    if (data && Array.isArray(data.results)) return data as HiitBatchResult;
+  }
+  throw new Error(`[HIIT API] ${r.status} ${r.statusText}`.trim());
+}
+
+export function batchCreateExercises(items: Array<Omit<HiitExerciseDto, 'id' | 'deletedAt'>>, atomic = true) {
+  return jBatch('exercises', 'POST', { items, atomic });
+}
+export function batchUpdateExercises(items: Array<Partial<HiitExerciseDto> & { id: string }>, atomic = true) {
+  return jBatch('exercises', 'PUT', { items, atomic });
+}
+export function batchDeleteExercises(ids: string[], hard = false, atomic = true) {
+  return jBatch('exercises/delete', 'POST', { ids, hard, atomic });
+}
+export function batchRestoreExercises(ids: string[], atomic = true) {
+  return jBatch('exercises/restore', 'POST', { ids, atomic });
+}
+export function batchCreateWorkouts(items: Array<Parameters<typeof createWorkout>[0]>, atomic = true) {
+  return jBatch('workouts', 'POST', { items, atomic });
+}
+export function batchUpdateWorkouts(items: Array<Parameters<typeof updateWorkout>[1] & { id: string }>, atomic = true) {
+  return jBatch('workouts', 'PUT', { items, atomic });
+}
+export function batchDeleteWorkouts(ids: string[], hard = false, atomic = true) {
+  return jBatch('workouts/delete', 'POST', { ids, hard, atomic });
+}
+export function batchRestoreWorkouts(ids: string[], atomic = true) {
+  return jBatch('workouts/restore', 'POST', { ids, atomic });
+}
+
+/* =========================
+ *   Media（manifest 查詢）
+ * ========================= */
+
+export type HiitMediaVariant = {
+  file: string; ext: string; type: string; kind: 'video' | 'image';
+  bytes: number; hash: string; url: string; // url 帶內容指紋（?v=），可永久快取
+};
+
+export async function getExerciseMedia(id: string): Promise<{ exerciseId: string; slug: string; variants: HiitMediaVariant[] }> {
+  const base = ensureBaseOrThrow();
+  return j(`${base}/api/hiit/exercises/${encodeURIComponent(id)}/media`);
+}
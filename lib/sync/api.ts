@@ -51,4 +51,38 @@ export async function continueSession() {
     deviceId,
     token,
   });
-}
\ No newline at end of file
+}
+// === New: 等待新版本（long-poll）===
+// 伺服端版本超過 sinceVersion 時立即回傳，否則最多等 timeoutSec 秒；changed=true 時再呼叫 callSync 拉變更
+export async function waitForVersion(sinceVersion: number, timeoutSec = 25) {
+  const { deviceId, token } = await ensureRegistered();
+  const url = new URL(`${BASE}/sync/wait`);
+  url.searchParams.set("deviceId", deviceId);
+  url.searchParams.set("token", token);
+  url.searchParams.set("sinceVersion", String(sinceVersion));
+  url.searchParams.set("timeout", String(timeoutSec));
+  const res = await fetch(url.toString(), { cache: "no-store" });
+  if (!res.ok) throw new Error(`wait failed: ${res.status}`);
+  return (await res.json()) as { ok: true; changed: boolean; serverVersion: number };
+}
+
+// === New: 伺服端串流匯出歷史紀錄 ===
+// 回傳下載網址（交給 <a href download> 或 window.location），由瀏覽器直接串流存檔，不經過記憶體
+export async function historyExportUrl(opts: {
+  format?: "csv" | "jsonl" | "parquet";
+  from?: string; // YYYY-MM-DD 或 ms timestamp
+  to?: string;
+  categories?: Array<"upper" | "lower" | "core" | "other">;
+  gzip?: boolean;
+} = {}) {
+  const { deviceId, token } = await ensureRegistered();
+  const url = new URL(`${BASE}/export/history`);
+  url.searchParams.set("deviceId", deviceId);
+  url.searchParams.set("token", token);
+  url.searchParams.set("format", opts.format ?? "csv");
+  if (opts.from) url.searchParams.set("from", opts.from);
+  if (opts.to) url.searchParams.set("to", opts.to);
+  for (const c of opts.categories ?? []) url.searchParams.append("category", c);
+  if (opts.gzip === false) url.searchParams.set("gzip", "false");
+  return url.toString();
+}
@@ -5,16 +5,28 @@ import { offlineChanged } from "@/lib/bus";
 type SyncResult = { ok: true } | { ok: false; error: string };
 
 // ---- 包裝 fetch，加上離線事件 ----
+// 伺服器回 429 / 503 時依 Retry-After 暫停送出，避免重試迴圈持續打 /sync
+let retryAfterUntil = 0;
+
 async function safeFetch(input: RequestInfo, init?: RequestInit) {
+  const wait = retryAfterUntil - Date.now();
+  if (wait > 0) throw new Error(`Server busy, retry in ${Math.ceil(wait / 1000)}s`);
   try {
     const res = await fetch(input, init);
+    if (res.status === 429 || res.status === 503) {
+      // 伺服器忙碌但仍在線：記下 Retry-After，不切換成 offline
+      const sec = Number(res.headers.get("retry-after")) || 1;
+      retryAfterUntil = Date.now() + sec * 1000;
+      offlineChanged.dispatchEvent(new CustomEvent("offline", { detail: false }));
+      throw Object.assign(new Error(`Server busy, retry in ${sec}s`), { busy: true });
+    }
     if (!res.ok) throw new Error(`HTTP ${res.status}`);
     // 線上成功 → 通知 online
     offlineChanged.dispatchEvent(new CustomEvent("offline", { detail: false }));
     return res;
-  } catch (err) {
+  } catch (err: any) {
     // 失敗 → 通知 offline
-    offlineChanged.dispatchEvent(new CustomEvent("offline", { detail: true }));
+    if (!err?.busy) offlineChanged.dispatchEvent(new CustomEvent("offline", { detail: true }));
     throw err;
   }
 }
@@ -0,0 +1,256 @@
+# File: server/admission.py
+"""
+同步端點的 process 內准入控制（admission control）。
+
+寫壞的客戶端或過緊的重試迴圈可能不停呼叫 /sync，每次都要跑聚合查詢與變更掃描，
+吃掉其他使用者的容量。這個 ASGI middleware 在進入 pydantic 驗證與 DB 之前就決定是否放行：
+
+- 每台裝置一個 token bucket；不同請求扣不同 token 數（完整 pull 比增量 pull / 小量 push 貴）。
+  deviceId 會隨 pull 回傳給其他使用者，不能拿來當 key：只有 (token, deviceId) 已在 app 的
+  已驗證 token 快取中（verify 回傳非 None）才算到該裝置，否則一律算在 client IP 的 bucket，
+  偽造 deviceId 的請求不會扣到別人的額度
+- 昂貴路由共用一個全域並發上限；低優先（完整 pull、大量 push）只能用其中一部分，
+  保留的額度留給小量 push 與一般 pull，尖峰時先犧牲完整 pull
+- 拒絕時直接回 429 + Retry-After（小 JSON，不觸發路由、不查 DB）
+- bucket 依最後使用時間排成 LRU，閒置超過 ADMIT_IDLE_SEC 就移除
+  （閒置夠久的 bucket 必然已補滿，移除不影響行為），記憶體與活躍裝置數成正比
+
+環境變數：
+  ADMIT_ENABLED        1 / 0（預設 1）
+  ADMIT_RATE           每台裝置每秒補充的 token（預設 5）
+  ADMIT_BURST          bucket 容量（預設 20）
+  ADMIT_MAX_INFLIGHT   昂貴路由全域並發上限（預設 32）
+  ADMIT_LOW_SHARE      低優先請求可用的並發比例（預設 0.5）
+  ADMIT_SMALL_PUSH     「小量 push」的列數上限（預設 50）
+  ADMIT_IDLE_SEC       閒置裝置移除秒數（預設 300）
+"""
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from . import metrics
+
+ADMIT_ENABLED = os.getenv("ADMIT_ENABLED", "1") not in ("0", "false", "no")
+ADMIT_RATE = float(os.getenv("ADMIT_RATE", "5"))
+ADMIT_BURST = float(os.getenv("ADMIT_BURST", "20"))
+ADMIT_MAX_INFLIGHT = int(os.getenv("ADMIT_MAX_INFLIGHT", "32"))
+ADMIT_LOW_SHARE = float(os.getenv("ADMIT_LOW_SHARE", "0.5"))
+ADMIT_SMALL_PUSH = int(os.getenv("ADMIT_SMALL_PUSH", "50"))
+ADMIT_IDLE_SEC = float(os.getenv("ADMIT_IDLE_SEC", "300"))
+
+HIGH, NORMAL, LOW = "high", "normal", "low"
+
+# 路由 → (需要讀 JSON body 分類, 是否受全域並發上限)
+GUARDED: Dict[Tuple[str, str], Tuple[bool, bool]] = {
+    ("POST", "/sync"): (True, True),
+    ("POST", "/sessions/continue"): (True, True),
+    ("GET", "/exercises/recent"): (False, True),
+    ("GET", "/export/history"): (False, False),   # 串流時間長，只扣 token、不占並發名額
+    ("GET", "/sync/wait"): (False, False),        # 等待期間不查 DB
+}
+# 每類請求扣的 token 數
+COSTS = {"push": 1.0, "pull": 1.0, "full_pull": 5.0, "big_push": 3.0, "export": 10.0, "other": 1.0}
+
+ADMISSION_REJECTED = metrics.register(metrics.Counter(
+    "admission_rejected_total", "Requests rejected with 429 by admission control", ("reason", "kind"),
+))
+ADMISSION_INFLIGHT = metrics.register(metrics.GaugeFunc(
+    "admission_inflight", "Expensive requests currently admitted",
+))
+ADMISSION_DEVICES = metrics.register(metrics.GaugeFunc(
+    "admission_tracked_devices", "Devices with a live token bucket",
+))
+
+
+class TokenBuckets:
+    """key → [tokens, last_refill]；OrderedDict 依最後使用時間排序，前端即最久未用。"""
+
+    def __init__(self, rate: float, burst: float, idle_sec: float):
+        self.rate = rate
+        self.burst = burst
+        # 閒置至少要久到 bucket 補滿，移除才不會讓客戶端多拿到 token
+        self.idle_sec = max(idle_sec, burst / rate if rate > 0 else 0)
+        self._lock = threading.Lock()
+        self._b: "OrderedDict[str, List[float]]" = OrderedDict()
+
+    def take(self, key: str, cost: float, now: Optional[float] = None) -> float:
+        """扣 token；成功回傳 0，否則回傳需等待的秒數。"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            b = self._b.get(key)
+            if b is None:
+                b = self._b[key] = [self.burst, now]
+            else:
+                b[0] = min(self.burst, b[0] + (now - b[1]) * self.rate)
+                b[1] = now
+                self._b.move_to_end(key)
+            self._evict(now)
+            if b[0] >= cost:
+                b[0] -= cost
+                return 0.0
+            return (cost - b[0]) / self.rate if self.rate > 0 else 60.0
+
+    def _evict(self, now: float) -> None:
+        while self._b:
+            key, b = next(iter(self._b.items()))
+            if now - b[1] < self.idle_sec:
+                break
+            self._b.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._b)
+
+
+class ConcurrencyLimit:
+    """非阻塞的並發名額：高優先可用全部，一般保留一小段，低優先只能用 low_share。"""
+
+    def __init__(self, limit: int, low_share: float):
+        self.limit = limit
+        self.caps = {
+            HIGH: limit,
+            NORMAL: max(1, int(limit * (1 + low_share) / 2)),
+            LOW: max(1, int(limit * low_share)),
+        }
+        self._lock = threading.Lock()
+        self.inflight = 0
+
+    def try_acquire(self, priority: str) -> bool:
+        with self._lock:
+            if self.inflight >= self.caps[priority]:
+                return False
+            self.inflight += 1
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            self.inflight -= 1
+
+
+def classify(path: str, body: Optional[dict], query: Dict[str, List[str]]) -> Tuple[str, str]:
+    """回傳 (kind, priority)。格式不對的欄位一律當 0 列，交給路由的 pydantic 回 422。"""
+    if path == "/sync" and body is not None:
+        changes = body.get("changes") or {}
+        rows = sum(
+            len(v) for v in (changes.get(k) for k in ("sessions", "exercises", "sets")) if isinstance(v, list)
+        ) if isinstance(changes, dict) else 0
+        if rows:
+            return ("push", HIGH) if rows <= ADMIT_SMALL_PUSH else ("big_push", LOW)
+        if not (body.get("lastVersion") or body.get("last_version")):
+            return "full_pull", LOW
+        return "pull", NORMAL
+    if path == "/export/history":
+        return "export", LOW
+    return "other", NORMAL
+
+
+def credentials(body: Optional[dict], query: Dict[str, List[str]]) -> Tuple[Optional[str], Optional[str]]:
+    """回傳請求自稱的 (deviceId, token)；尚未驗證。"""
+    if body is not None:
+        device, token = body.get("deviceId") or body.get("device_id"), body.get("token")
+    else:
+        device, token = (query.get("deviceId") or [None])[0], (query.get("token") or [None])[0]
+    return (device if isinstance(device, str) else None), (token if isinstance(token, str) else None)
+
+
+class AdmissionMiddleware:
+    """純 ASGI middleware；只處理 GUARDED 內的路由，其餘直接放行。
+
+    verify(token, deviceId) 回傳 userId 表示這組憑證已驗證過（不可查 DB，只看快取）；
+    未提供時所有請求都算在 client IP 的 bucket。
+    """
+
+    def __init__(self, app, enabled: bool = ADMIT_ENABLED,
+                 verify: Optional[Callable[[str, str], Optional[str]]] = None):
+        self.app = app
+        self.enabled = enabled
+        self.verify = verify
+        self.buckets = TokenBuckets(ADMIT_RATE, ADMIT_BURST, ADMIT_IDLE_SEC)
+        self.limit = ConcurrencyLimit(ADMIT_MAX_INFLIGHT, ADMIT_LOW_SHARE)
+        ADMISSION_INFLIGHT.set_function(lambda: {(): self.limit.inflight})
+        ADMISSION_DEVICES.set_function(lambda: {(): len(self.buckets)})
+
+    async def __call__(self, scope, receive, send):
+        guard = GUARDED.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+        if guard is None or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+        needs_body, limited = guard
+
+        body_obj = None
+        if needs_body:
+            raw = await _read_body(receive)
+            receive = _replay(raw, receive)
+            try:
+                body_obj = json.loads(raw) if raw else None
+            except ValueError:
+                body_obj = None  # 交給路由回 422
+            if not isinstance(body_obj, dict):
+                body_obj = {}
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+
+        kind, priority = classify(scope["path"], body_obj, query)
+        wait = self.buckets.take(self.bucket_key(scope, *credentials(body_obj, query)), COSTS[kind])
+        if wait > 0:
+            ADMISSION_REJECTED.inc(1, "rate", kind)
+            await _reject(send, wait, "rate limit exceeded for this device")
+            return
+        if limited and not self.limit.try_acquire(priority):
+            ADMISSION_REJECTED.inc(1, "concurrency", kind)
+            await _reject(send, 1, "server busy")
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if limited:
+                self.limit.release()
+
+
+    def bucket_key(self, scope, device: Optional[str], token: Optional[str]) -> str:
+        if device and token and self.verify is not None and self.verify(token, device) is not None:
+            return f"device:{device}"
+        client = scope.get("client")
+        return f"ip:{client[0]}" if client else "anonymous"
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        msg = await receive()
+        if msg["type"] != "http.request":
+            break
+        chunks.append(msg.get("body", b""))
+        if not msg.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+def _replay(raw: bytes, receive):
+    sent = False
+
+    async def _receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": raw, "more_body": False}
+        return await receive()
+
+    return _receive
+
+
+async def _reject(send, retry_after: float, detail: str) -> None:
+    body = json.dumps({"detail": detail}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": 429,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("ascii")),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode("ascii")),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
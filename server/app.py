@@ -1,28 +1,50 @@
 # /server/app.py
-from typing import Any, Optional, Callable
+"""
+Workout Notes Sync API。
 
-from fastapi import FastAPI, Depends, HTTPException, Query
+以 create_app() 組裝 FastAPI app；uvicorn 可用 `server.app:app` 或 `--factory server.app:create_app` 啟動。
+import 時只定義路由與 middleware，耗時的初始化（建表 / migrations、notifier 版本、HIIT seed、
+媒體 manifest）放在 lifespan 啟動階段，並在 threadpool 內平行執行；各步驟耗時見 /diagnostics/startup
+與 app_startup_seconds metric（量測工具：benchmarks/bench_startup.py）。
+"""
+import time
+
+_IMPORT_T0 = time.perf_counter()
+
+import asyncio
+import hmac
+import os
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional, Callable
+
+from fastapi import APIRouter, FastAPI, Depends, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
 from sqlalchemy.orm import Session
 
-from .database import Base, engine, get_db
-from . import models, schemas
+from .database import Base, SessionLocal, engine, get_db
+from . import export, metrics, models, schemas, shards, slowlog
+from .admission import AdmissionMiddleware
 from .crud import (
     ensure_user_device_token,
-    upsert_sessions, upsert_exercises, upsert_sets,
+    push_and_pull,
     list_changes_since, get_token_by_device,
     continue_latest_session, get_recent_exercises,
 )
+from .migrate import run_migrations
+from .notify import GLOBAL_SCOPE, notifier
+from .pullcache import external_change, pull_cache
 from .utils import new_id, get_current_version
+from .writer import WriteQueueFull, get_writer
 
 # ✅ HIIT 子路由（/api/hiit/*）
-from .hiit.router import hiit as hiit_router
-
-# ---- DB 初始化 ----
-Base.metadata.create_all(bind=engine)
-
-app = FastAPI(title="Workout Notes Sync API")
+from .hiit import media as hiit_media
+from .hiit.router import hiit as hiit_router, DB as HIIT_DB, load_seed as load_hiit_seed
 
 # ---- CORS 設定 ----
 ALLOWED_ORIGINS = [
@@ -43,30 +65,92 @@ PRIVATE_NET_REGEX = r"http://(192\.168|10\.\d{1,3}|172\.(1[6-9]|2[0-9]|3[0-1]))\
 # ✅ Pages 的臨時部署域，如 6708ccb7.workout-notes.pages.dev
 PAGES_DEPLOY_REGEX = r"https://[a-z0-9\-]+\.workout-notes\.pages\.dev"
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=ALLOWED_ORIGINS,
-    allow_origin_regex=f"(?:{PRIVATE_NET_REGEX})|(?:{PAGES_DEPLOY_REGEX})",
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+CORS_ORIGIN_REGEX = f"(?:{PRIVATE_NET_REGEX})|(?:{PAGES_DEPLOY_REGEX})"
+
+# ---- Metrics / 慢查詢：掛在 engine 上（整個 process 一次） ----
+metrics.instrument_engine(engine)
+slowlog.instrument_engine(engine)
+metrics.HIIT_ITEMS.set_function(lambda: {(k,): len(v) for k, v in HIIT_DB.items()})
 
-# ✅ 掛上 HIIT 路由
-app.include_router(hiit_router)
+# 版本前進即清掉該 scope 的 pull 回應快取
+notifier.subscribe(lambda version, scope: pull_cache.invalidate(scope))
+
+api = APIRouter()
+
+# ---- SQLite 鎖競爭：回 503 + Retry-After，讓客戶端（與壓測工具）能辨識並退避 ----
+def sqlite_operational_error(request: Request, exc: OperationalError):
+    msg = str(exc.orig).lower()
+    if "locked" in msg or "busy" in msg:
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "database is locked"},
+            headers={"Retry-After": "1"},
+        )
+    return JSONResponse(status_code=500, content={"detail": "database error"})
+
+def write_queue_full(request: Request, exc: WriteQueueFull):
+    # commit queue 背壓：請客戶端稍後重試
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+def db_pool_timeout(request: Request, exc: PoolTimeoutError):
+    # 連線池用盡（同時請求過多）
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "database busy"},
+        headers={"Retry-After": "1"},
+    )
 
 # ---- 基本路由 ----
-@app.get("/")
+@api.get("/")
 def root() -> dict[str, Any]:
     return {"ok": True, "name": "Workout Notes Sync API"}
 
-@app.get("/health")
+@api.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    """Prometheus text format。"""
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+# ---- 管理用診斷端點 ----
+# 慢查詢含完整 SQL 與綁定參數（deviceId / userId / sessionId），只給持有 SYNC_ADMIN_TOKEN 的人看；
+# 未設定時端點視同不存在（404）
+ADMIN_TOKEN = os.getenv("SYNC_ADMIN_TOKEN", "")
+
+def require_admin(x_admin_token: str = Header("")):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="admin token required")
+
+@api.get("/diagnostics/slow-queries", dependencies=[Depends(require_admin)], include_in_schema=False)
+def slow_queries(limit: int = Query(50, ge=1, le=500)):
+    """慢查詢 ring buffer（含 EXPLAIN QUERY PLAN）與全表掃描彙總。"""
+    return slowlog.snapshot(limit)
+
+@api.post("/diagnostics/slow-queries/reset", dependencies=[Depends(require_admin)], include_in_schema=False)
+def slow_queries_reset():
+    """清空 ring buffer 與全表掃描彙總。"""
+    slowlog.reset()
+    return {"ok": True}
+
+@api.get("/diagnostics/startup")
+def startup_profile():
+    """本 process 各啟動步驟耗時（ms）：app 模組 import、lifespan 內各初始化工作與總計。"""
+    return {"phases": {k: round(v * 1000, 2) for k, v in STARTUP.items()}}
+
+@api.get("/health")
 def health(db: Session = Depends(get_db)):
-    """健康檢查：僅回傳目前 serverVersion。"""
-    return {"ok": True, "serverVersion": get_current_version(db)}
+    """健康檢查：僅回傳目前 serverVersion（分片模式下為 directory DB 的版本，並附上分片數）。"""
+    out = {"ok": True, "serverVersion": get_current_version(db)}
+    if shards.enabled():
+        out["shards"] = shards.SHARD_COUNT
+    return out
 
 # ---------- Auth：註冊裝置（冪等） ----------
-@app.post("/auth/register-device", response_model=schemas.RegisterDeviceResponse)
+@api.post("/auth/register-device", response_model=schemas.RegisterDeviceResponse)
 def register_device(payload: schemas.RegisterDeviceRequest, db: Session = Depends(get_db)):
     device_id = payload.device_id or new_id()
 
@@ -80,7 +164,7 @@ def register_device(payload: schemas.RegisterDeviceRequest, db: Session = Depend
 
     user_id = new_id()
     token = new_id()
-    ensure_user_device_token(db, user_id, device_id, token)
+    get_writer().call(ensure_user_device_token, user_id, device_id, token, commit=False, key=device_id)
 
     return schemas.RegisterDeviceResponse(
         user_id=user_id,
@@ -95,12 +179,12 @@ class AttachDevicePayload(BaseModel):
     class Config:
         allow_population_by_field_name = True
 
-@app.post("/auth/attach-device", response_model=schemas.RegisterDeviceResponse)
+@api.post("/auth/attach-device", response_model=schemas.RegisterDeviceResponse)
 def attach_device(payload: AttachDevicePayload, db: Session = Depends(get_db)):
     device_id = payload.device_id or new_id()
     user_id = payload.user_id
     token = new_id()
-    ensure_user_device_token(db, user_id, device_id, token)
+    get_writer().call(ensure_user_device_token, user_id, device_id, token, commit=False, key=device_id)
     return schemas.RegisterDeviceResponse(user_id=user_id, device_id=device_id, token=token)
 
 def verify_token(db: Session, token: str, device_id: str) -> models.Token:
@@ -109,25 +193,134 @@ def verify_token(db: Session, token: str, device_id: str) -> models.Token:
         raise HTTPException(status_code=401, detail="Invalid token/device")
     return tk
 
+# ---------- 已驗證 token 快取 ----------
+# token 不會被撤銷，驗證過的 (token → (deviceId, userId)) 可安全快取；
+# 重複的 pull-only /sync 與 long-poll 不需為了驗證再查 DB
+TOKEN_CACHE_MAX = 10_000
+_verified_tokens: "OrderedDict[str, tuple[str, str]]" = OrderedDict()
+_token_lock = threading.Lock()
+
+def _cached_user(token: str, device_id: str) -> Optional[str]:
+    with _token_lock:
+        hit = _verified_tokens.get(token)
+        if hit is None or hit[0] != device_id:
+            return None
+        _verified_tokens.move_to_end(token)
+        return hit[1]
+
+def _remember_token(token: str, device_id: str, user_id: str) -> None:
+    with _token_lock:
+        _verified_tokens[token] = (device_id, user_id)
+        while len(_verified_tokens) > TOKEN_CACHE_MAX:
+            _verified_tokens.popitem(last=False)
+
+def _authenticate(db: Session, token: str, device_id: str) -> str:
+    """回傳 user_id；命中快取時不查 DB。"""
+    user_id = _cached_user(token, device_id)
+    if user_id is None:
+        user_id = verify_token(db, token, device_id).user_id
+        _remember_token(token, device_id, user_id)
+    return user_id
+
+def _encode(model: BaseModel) -> bytes:
+    dump_json = getattr(model, "model_dump_json", None)
+    return (dump_json(by_alias=True) if dump_json else model.json(by_alias=True)).encode("utf-8")
+
+def _refresh_version(data: Session, scope: str) -> None:
+    """DB 在本 process 之外被改過：以 DB 的版本為準。前進則 publish（順便喚醒 long-poll），
+    倒退（還原舊備份）時 notifier 不倒退，只清掉快取；之後的 key 對不上 notifier 版本，一律 miss。"""
+    version = get_current_version(data)
+    known = notifier.current(scope)
+    if known is None or version > known:
+        notifier.publish(version, scope)
+    if version != known:
+        pull_cache.invalidate(scope)
+
 # ---------- Sync ----------
-@app.post("/sync", response_model=schemas.SyncResponse)
+@api.post("/sync", response_model=schemas.SyncResponse)
 def sync(payload: schemas.SyncRequest, db: Session = Depends(get_db)):
     device_id = payload.device_id
-    verify_token(db, payload.token, device_id)
+    user_id = _authenticate(db, payload.token, device_id)
+    scope = shards.scope_for(user_id)
 
     def to_dict(m: Any) -> dict:
-        fn: Optional[Callable[[], dict]] = getattr(m, "model_dump", None) or getattr(m, "dict", None)
-        return fn() if fn else dict(m)
+        # 以 alias（camelCase）輸出，才能對上 ORM 欄位名（startedAt / deviceId ...）
+        fn: Optional[Callable[..., dict]] = getattr(m, "model_dump", None) or getattr(m, "dict", None)
+        return fn(by_alias=True) if fn else dict(m)
+
+    changes = payload.changes
+    metrics.SYNC_ROWS.observe(len(changes.sessions) + len(changes.exercises) + len(changes.sets), "push")
+
+    if changes.sessions or changes.exercises or changes.sets:
+        # push + pull 合併為一個寫入工作（single-writer commit queue，與其他裝置的 push 一起 group commit）：
+        # 只讀回本次配置版本之前的其他變更，serverVersion 直接取本次配置的最後一個版本
+        s, e, z, cur = shards.writer_for(user_id).call(
+            push_and_pull,
+            [to_dict(r) for r in changes.sessions],
+            [to_dict(r) for r in changes.exercises],
+            [to_dict(r) for r in changes.sets],
+            payload.last_version,
+            key=device_id,
+        )
+        # 喚醒 /sync/wait 上等待的其他裝置（同時清掉此 scope 的 pull 快取）
+        notifier.publish(cur, scope)
+        rows = len(s) + len(e) + len(z)
+        metrics.SYNC_ROWS.observe(rows, "pull")
+        body = _encode(schemas.SyncResponse(server_version=cur, changes=schemas.SyncResult(sessions=s, exercises=e, sets=z)))
+        return Response(content=body, media_type="application/json")
 
-    if payload.changes.sessions:
-        upsert_sessions(db, [to_dict(r) for r in payload.changes.sessions])
-    if payload.changes.exercises:
-        upsert_exercises(db, [to_dict(r) for r in payload.changes.exercises])
-    if payload.changes.sets:
-        upsert_sets(db, [to_dict(r) for r in payload.changes.sets])
+    # pull-only：版本沒變就直接回傳先前編碼好的 bytes，不查資料表
+    with shards.data_session(user_id, db) as data:
+        if pull_cache.enabled and external_change(data):
+            _refresh_version(data, scope)
+        hit = pull_cache.get(scope, payload.last_version, notifier.current(scope))
+        if hit is not None:
+            body, rows = hit
+            metrics.SYNC_ROWS.observe(rows, "pull")
+            return Response(content=body, media_type="application/json")
+        s, e, z, cur = list_changes_since(data, payload.last_version)
+    if notifier.current(scope) is None:
+        notifier.prime(cur, scope)
+    rows = len(s) + len(e) + len(z)
+    metrics.SYNC_ROWS.observe(rows, "pull")
+    body = _encode(schemas.SyncResponse(server_version=cur, changes=schemas.SyncResult(sessions=s, exercises=e, sets=z)))
+    # 以查詢當下的 cur 當 key：同一個 serverVersion 下 version > lastVersion 的資料固定不變
+    pull_cache.put(scope, payload.last_version, cur, body, rows)
+    return Response(content=body, media_type="application/json")
 
-    s, e, z, cur = list_changes_since(db, payload.last_version)
-    return schemas.SyncResponse(server_version=cur, changes=schemas.SyncResult(sessions=s, exercises=e, sets=z))
+# ---------- Long-poll：等待新版本 ----------
+def _verify_and_prime(token: str, device_id: str) -> str:
+    db = SessionLocal()
+    try:
+        user_id = _authenticate(db, token, device_id)
+        scope = shards.scope_for(user_id)
+        if notifier.current(scope) is None:
+            with shards.data_session(user_id, db) as data:
+                notifier.prime(get_current_version(data), scope)
+    finally:
+        db.close()
+    return scope
+
+@api.get("/sync/wait")
+async def sync_wait(
+    deviceId: str = Query(...),
+    token: str = Query(...),
+    sinceVersion: int = Query(..., ge=0),
+    timeout: float = Query(25.0, ge=0, le=60),
+):
+    """
+    Long-poll：serverVersion 超過 sinceVersion 時立即回應，否則最多等 timeout 秒。
+    回應後客戶端再呼叫 /sync 取實際變更；等待期間不佔 DB 連線也不查詢。
+    """
+    user_id = _cached_user(token, deviceId)
+    scope = shards.scope_for(user_id) if user_id is not None else None
+    if scope is None or notifier.current(scope) is None:
+        scope = await run_in_threadpool(_verify_and_prime, token, deviceId)
+    version = await notifier.wait(sinceVersion, timeout, scope)
+    return JSONResponse(
+        {"ok": True, "changed": version > sinceVersion, "serverVersion": version},
+        headers={"Cache-Control": "no-store"},
+    )
 
 # ---------- Phase 2: 新增端點 ----------
 class ContinuePayload(BaseModel):
@@ -136,21 +329,134 @@ class ContinuePayload(BaseModel):
     class Config:
         allow_population_by_field_name = True
 
-@app.post("/sessions/continue")
+@api.post("/sessions/continue")
 def continue_session(payload: ContinuePayload, db: Session = Depends(get_db)):
-    verify_token(db, payload.token, payload.device_id)
-    s = continue_latest_session(db, device_id=payload.device_id)
+    user_id = _authenticate(db, payload.token, payload.device_id)
+    s = shards.writer_for(user_id).call(
+        continue_latest_session, payload.device_id, commit=False, key=payload.device_id
+    )
     if not s:
         raise HTTPException(status_code=404, detail="No session to continue")
+    notifier.publish(s["version"], shards.scope_for(user_id))
     return {"ok": True, "session": s}
 
-@app.get("/exercises/recent")
+@api.get("/exercises/recent")
 def recent_exercises(
     deviceId: str = Query(...),
     token: str = Query(...),
     limitSessions: int = Query(5, ge=1, le=50),
     db: Session = Depends(get_db),
 ):
-    verify_token(db, token, deviceId)
-    items = get_recent_exercises(db, device_id=deviceId, recent_sessions=limitSessions)
-    return {"ok": True, "items": items}
\ No newline at end of file
+    user_id = _authenticate(db, token, deviceId)
+    with shards.data_session(user_id, db) as data:
+        items = get_recent_exercises(data, device_id=deviceId, recent_sessions=limitSessions)
+    return {"ok": True, "items": items}
+
+# ---------- 歷史紀錄匯出（串流） ----------
+def _history_stream(user_id: str, device_ids: list, fmt: str, gzip: bool, **filters):
+    # 自行開 session：StreamingResponse 在路由返回後才開始讀取，request 的 get_db session 已關閉
+    with shards.data_session(user_id) as data:
+        yield from export.encode(export.iter_history(data, device_ids, **filters), fmt, gzip)
+
+@api.get("/export/history")
+def export_history(
+    deviceId: str = Query(...),
+    token: str = Query(...),
+    format: str = Query("csv", pattern="^(csv|jsonl|parquet)$"),
+    from_: Optional[str] = Query(None, alias="from", description="ms timestamp 或 YYYY-MM-DD（含）"),
+    to: Optional[str] = Query(None, description="ms timestamp（不含）或 YYYY-MM-DD（含當天）"),
+    category: list[str] = Query([], description="可重複；upper / lower / core / other"),
+    gzip: bool = Query(True, description="CSV / JSONL 以 gzip 壓縮（Parquet 本身已壓縮）"),
+    db: Session = Depends(get_db),
+):
+    """串流匯出此使用者所有裝置的訓練紀錄（每列一組），記憶體用量與紀錄長度無關。"""
+    user_id = _authenticate(db, token, deviceId)
+    if format == "parquet" and not export.parquet_available():
+        raise HTTPException(status_code=501, detail="parquet export requires pyarrow on the server")
+    bad = [c for c in category if c not in models.CATEGORY_VALUES]
+    if bad:
+        raise HTTPException(status_code=422, detail=f"unknown category: {', '.join(bad)}")
+    try:
+        start_ms, end_ms = export.parse_bound(from_), export.parse_bound(to, end=True)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="from/to must be a ms timestamp or YYYY-MM-DD")
+
+    device_ids = [d for (d,) in db.query(models.Device.id).filter(models.Device.user_id == user_id)]
+    filename = export.filename(format, gzip)
+    return StreamingResponse(
+        _history_stream(user_id, device_ids, format, gzip,
+                        start_ms=start_ms, end_ms=end_ms, categories=category),
+        media_type="application/gzip" if gzip and format != "parquet" else export.MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Cache-Control": "no-store",
+        },
+    )
+
+# ---------- 啟動（lifespan）與 app factory ----------
+STARTUP: Dict[str, float] = {}  # 啟動步驟 → 秒
+
+STARTUP_SECONDS = metrics.register(metrics.GaugeFunc(
+    "app_startup_seconds", "Time spent in each startup phase of this process", ("phase",),
+    fn=lambda: {(k,): v for k, v in STARTUP.items()},
+))
+
+def _prepare_database() -> None:
+    """建立缺少的表、套用 server/migrations/，再以目前版本初始化 notifier（第一個 /sync/wait 不必查 DB）。"""
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    if notifier.current(GLOBAL_SCOPE) is None:
+        db = SessionLocal()
+        try:
+            notifier.prime(get_current_version(db), GLOBAL_SCOPE)
+        finally:
+            db.close()
+
+# 彼此獨立的啟動工作：在 threadpool 平行執行（DB 的 fsync 等待與 JSON 解析可重疊）
+STARTUP_TASKS = (
+    ("database", _prepare_database),
+    ("hiit_seed", load_hiit_seed),
+    ("media_manifest", hiit_media.load_manifest),
+)
+
+def _timed(name: str, fn: Callable[[], Any]) -> None:
+    t0 = time.perf_counter()
+    fn()
+    STARTUP[name] = time.perf_counter() - t0
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    t0 = time.perf_counter()
+    await asyncio.gather(*(run_in_threadpool(_timed, name, fn) for name, fn in STARTUP_TASKS))
+    STARTUP["lifespan"] = time.perf_counter() - t0
+    yield
+
+def create_app() -> FastAPI:
+    """組裝 app（不碰 DB）；DB 與資料載入在 lifespan 啟動時才進行。"""
+    app = FastAPI(title="Workout Notes Sync API", lifespan=lifespan)
+
+    # 准入控制：每裝置 token bucket + 昂貴路由並發上限；放在 CORS 內層，429 也帶 CORS header
+    # 只有已驗證過的 token 才算到該裝置的 bucket（_cached_user 只看快取、不查 DB）
+    app.add_middleware(AdmissionMiddleware, verify=_cached_user)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=ALLOWED_ORIGINS,
+        allow_origin_regex=CORS_ORIGIN_REGEX,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    # Metrics：最外層 middleware，量到含 CORS 在內的完整延遲
+    app.add_middleware(metrics.MetricsMiddleware)
+
+    app.add_exception_handler(OperationalError, sqlite_operational_error)
+    app.add_exception_handler(WriteQueueFull, write_queue_full)
+    app.add_exception_handler(PoolTimeoutError, db_pool_timeout)
+
+    app.include_router(api)
+    # ✅ 掛上 HIIT 路由
+    app.include_router(hiit_router)
+    return app
+
+app = create_app()
+STARTUP["app_import"] = time.perf_counter() - _IMPORT_T0
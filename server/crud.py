@@ -10,7 +10,7 @@ import time
 log = logging.getLogger("sync-api")
 
 
-def ensure_user_device_token(db: Session, user_id: str, device_id: str, token: str):
+def ensure_user_device_token(db: Session, user_id: str, device_id: str, token: str, commit: bool = True):
     user = db.get(models.User, user_id) or models.User(id=user_id)
     db.add(user)
 
@@ -25,7 +25,8 @@ def ensure_user_device_token(db: Session, user_id: str, device_id: str, token: s
         tk = models.Token(token=token, user_id=user.id, device_id=device.id)
         db.add(tk)
 
-    db.commit()
+    if commit:
+        db.commit()
     log.info("ensure_user_device_token: user=%s device=%s token=%s", user_id, device_id, token)
 
 
@@ -33,92 +34,139 @@ def get_token_by_device(db: Session, device_id: str) -> models.Token | None:
     return db.query(models.Token).filter(models.Token.device_id == device_id).first()
 
 
-def upsert_sessions(db: Session, rows: List[dict]) -> int:
+UPSERT_CHUNK = 500  # IN (...) 參數數量上限內分批（SQLite 預設最多 999 / 32766 個變數）
+
+
+def _upsert_rows(db: Session, model, rows: List[dict], version: int | None = None) -> int:
     """
-    支援 status 欄位（in_progress/ended）。
-    若 client 上傳 ended 的紀錄，之後再上傳 in_progress 視為「接續同一筆」，覆寫 status。
+    逐筆 upsert，從 version + 1 起依序指派新 version（未給時取目前版本）；回傳最後指派的 version。
+    既有列以 id IN (...) 一次取回，不逐筆查詢。不 commit，交易邊界由呼叫端決定。
     """
-    version = get_current_version(db)
+    if version is None:
+        version = get_current_version(db)
+    ids = [r["id"] for r in rows]
+    existing = {}
+    for i in range(0, len(ids), UPSERT_CHUNK):
+        for obj in db.query(model).filter(model.id.in_(ids[i:i + UPSERT_CHUNK])):
+            existing[obj.id] = obj
     for r in rows:
-        cur = db.get(models.Session, r["id"])
-        version = bump_version(db)
+        version += 1
+        cur = existing.get(r["id"])
         if cur:
             for k, v in r.items():
                 setattr(cur, k, v)
             cur.version = version
-            db.add(cur)
         else:
-            db.add(models.Session(version=version, **r))
-    db.commit()
+            existing[r["id"]] = cur = model(version=version, **r)
+        db.add(cur)
+    return version
+
+
+def upsert_sessions(db: Session, rows: List[dict], commit: bool = True) -> int:
+    """
+    支援 status 欄位（in_progress/ended）。
+    若 client 上傳 ended 的紀錄，之後再上傳 in_progress 視為「接續同一筆」，覆寫 status。
+    """
+    version = _upsert_rows(db, models.Session, rows)
+    if commit:
+        db.commit()
     log.info("upsert_sessions: %d", len(rows))
     return version
 
 
-def upsert_exercises(db: Session, rows: List[dict]) -> int:
+def upsert_exercises(db: Session, rows: List[dict], commit: bool = True) -> int:
     """
     支援 category（upper/lower/core/other）與 defaultUnit（kg/lb/sec/min）。
     """
-    version = get_current_version(db)
-    for r in rows:
-        cur = db.get(models.Exercise, r["id"])
-        version = bump_version(db)
-        if cur:
-            for k, v in r.items():
-                setattr(cur, k, v)
-            cur.version = version
-            db.add(cur)
-        else:
-            db.add(models.Exercise(version=version, **r))
-    db.commit()
+    version = _upsert_rows(db, models.Exercise, rows)
+    if commit:
+        db.commit()
     log.info("upsert_exercises: %d", len(rows))
     return version
 
 
-def upsert_sets(db: Session, rows: List[dict]) -> int:
+def upsert_sets(db: Session, rows: List[dict], commit: bool = True) -> int:
     """
     支援 unit：kg/lb/sec/min（或 NULL）。
     """
-    version = get_current_version(db)
-    for r in rows:
-        cur = db.get(models.SetRecord, r["id"])
-        version = bump_version(db)
-        if cur:
-            for k, v in r.items():
-                setattr(cur, k, v)
-            cur.version = version
-            db.add(cur)
-        else:
-            db.add(models.SetRecord(version=version, **r))
-    db.commit()
+    version = _upsert_rows(db, models.SetRecord, rows)
+    if commit:
+        db.commit()
     log.info("upsert_sets: %d", len(rows))
     return version
 
 
+def write_changes(db: Session, sessions: List[dict], exercises: List[dict], sets: List[dict]) -> Tuple[int, int]:
+    """
+    三張表在同一個交易內寫入（不 commit），只在開頭取一次目前版本，之後每列依序 +1。
+    回傳本次配置的版本區間 (start, end]：本次寫入的列 version 皆在 start+1 .. end；沒有變更時為 (0, 0)。
+    """
+    if not (sessions or exercises or sets):
+        return 0, 0
+    start = version = get_current_version(db)
+    for model, rows in ((models.Session, sessions), (models.Exercise, exercises), (models.SetRecord, sets)):
+        if rows:
+            version = _upsert_rows(db, model, rows, version)
+    db.flush()
+    log.info("write_changes: sessions=%d exercises=%d sets=%d versions=%d..%d",
+             len(sessions), len(exercises), len(sets), start + 1, version)
+    return start, version
+
+
+def apply_changes(db: Session, sessions: List[dict], exercises: List[dict], sets: List[dict]) -> int:
+    """
+    /sync push：三張表在同一個交易內寫入（不 commit，交給 commit queue 一起提交）。
+    回傳寫入後的最新 version（沒有任何變更時為 0）。
+    """
+    return write_changes(db, sessions, exercises, sets)[1]
+
+
+def _row_dict(x) -> dict:
+    return {c.name: getattr(x, c.name) for c in x.__table__.columns}
+
+
+def _changes_between(db: Session, since_version: int, until_version: int | None = None) -> Tuple[list, list, list]:
+    """三張表 version 在 (since_version, until_version] 的列（until_version 為 None 時不設上限）。"""
+    out = []
+    for model in (models.Session, models.Exercise, models.SetRecord):
+        q = db.query(model).filter(model.version > since_version)
+        if until_version is not None:
+            q = q.filter(model.version <= until_version)
+        out.append([_row_dict(x) for x in q.all()])
+    return out[0], out[1], out[2]
+
+
 def list_changes_since(db: Session, since_version: int) -> Tuple[list, list, list, int]:
-    sessions = (
-        db.query(models.Session).filter(models.Session.version > since_version).all()
-    )
-    exercises = (
-        db.query(models.Exercise).filter(models.Exercise.version > since_version).all()
-    )
-    sets = db.query(models.SetRecord).filter(models.SetRecord.version > since_version).all()
+    """
+    先取目前版本 cur，再讀 (since_version, cur] 的列。
+    sqlite3 的 SELECT 不在同一個快照內；若先讀列再取 MAX，中間提交的寫入會讓 cur 超過實際回傳的資料，
+    客戶端以 cur 當 lastVersion 後就永遠拿不到那些列。已提交的版本必為連續前綴，上限以 cur 截斷即一致。
+    """
     cur = get_current_version(db)
+    sessions, exercises, sets = _changes_between(db, since_version, cur)
+    return sessions, exercises, sets, cur
 
-    def to_dict(x):
-        d = {c.name: getattr(x, c.name) for c in x.__table__.columns}
-        return d
 
-    return (
-        [to_dict(s) for s in sessions],
-        [to_dict(e) for e in exercises],
-        [to_dict(z) for z in sets],
-        cur,
-    )
+def push_and_pull(
+    db: Session, sessions: List[dict], exercises: List[dict], sets: List[dict], since_version: int,
+) -> Tuple[list, list, list, int]:
+    """
+    /sync push + pull 合併成一個寫入工作（在 commit queue 的同一個交易內執行）。
+
+    寫入後只讀 (since_version, start] 的變更：其他裝置的寫入，以及同一批 group commit 中排在前面的
+    工作（同一交易內已 flush，版本都 <= start）。(start, end] 是剛寫入、客戶端手上已有的列，不再讀回；
+    serverVersion 即 end，不再跑 MAX 聚合。客戶端已是最新（since_version >= start）時完全不查詢。
+    """
+    start, end = write_changes(db, sessions, exercises, sets)
+    if since_version >= start:
+        return [], [], [], end
+    s, e, z = _changes_between(db, since_version, start)
+    return s, e, z, end
 
 
 # -------- Phase 2: 新增輔助功能 --------
 
-def continue_latest_session(db: Session, device_id: str) -> dict | None:
+def continue_latest_session(db: Session, device_id: str, commit: bool = True) -> dict | None:
     """
     取「此裝置」最近一筆 session（包含已結束），將其狀態改為 in_progress 並清空 endedAt，回傳 dict。
     若不存在任何 session，回傳 None。
@@ -139,7 +187,10 @@ def continue_latest_session(db: Session, device_id: str) -> dict | None:
     s.updatedAt = now_ms
     s.version = bump_version(db)
     db.add(s)
-    db.commit()
+    if commit:
+        db.commit()
+    else:
+        db.flush()
 
     return {c.name: getattr(s, c.name) for c in s.__table__.columns}
 
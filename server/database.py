@@ -1,12 +1,33 @@
 # server/database.py
-from sqlalchemy import create_engine
+import os
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./sync.db"
+# 可用環境變數覆寫（benchmarks / 測試用獨立 DB）
+SQLALCHEMY_DATABASE_URL = os.getenv("SYNC_DATABASE_URL", "sqlite:///./sync.db")
+
+
+
+def enable_sqlite_transactions(engine) -> None:
+    """
+    pysqlite 預設不送 BEGIN（只在 DML 前隱式開交易），SAVEPOINT 會自己開啟交易、RELEASE 時就提交，
+    commit queue 每個工作的 SAVEPOINT 因而各自落盤。依 SQLAlchemy 文件的 pysqlite SAVEPOINT 作法：
+    關閉 driver 的交易處理，改由 "begin" 事件明確送出 BEGIN，交易邊界完全由 SQLAlchemy 決定。
+    """
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def _begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
+enable_sqlite_transactions(engine)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
 Base = declarative_base()
@@ -0,0 +1,244 @@
+# File: server/export.py
+"""
+歷史紀錄串流匯出（CSV / JSON Lines / Parquet）。
+
+前端以 IndexedDB 組整包 JSON 匯出（lib/export/history.ts），紀錄一長在低記憶體手機上就會失敗。
+這裡改由伺服端串流：
+
+- 以 session 為單位分批讀取（keyset：(startedAt, id) > 上一批最後一筆），每批再以 sessionId IN (...)
+  取該批的 sets（JOIN exercises 取名稱與分類）；不使用 OFFSET，也不把整個結果載入記憶體
+- 每批之間結束讀取交易，慢速下載不會長時間占住 WAL snapshot
+- 輸出逐批編碼、逐塊 gzip 壓縮（zlib streaming），記憶體用量只跟批次大小有關
+- 每列 = 一組（set），附帶所屬 session 與動作名稱 / 分類；已軟刪的 session / set 不匯出
+
+Parquet 需要 pyarrow（選用相依，未安裝時回 501）；Parquet 本身已壓縮（zstd），不再套 gzip。
+
+環境變數：
+  SYNC_EXPORT_BATCH  每批 session 數（預設 200）
+"""
+import csv
+import importlib.util
+import io
+import json
+import os
+import zlib
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import Session
+
+from . import metrics, models
+
+EXPORT_BATCH = int(os.getenv("SYNC_EXPORT_BATCH", "200"))
+
+FORMATS = ("csv", "jsonl", "parquet")
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+HISTORY_COLUMNS = (
+    "date", "sessionId", "sessionStartedAt", "sessionEndedAt", "sessionStatus",
+    "setId", "exerciseId", "exerciseName", "category",
+    "weight", "reps", "unit", "rpe", "createdAt",
+)
+
+EXPORT_ROWS = metrics.register(metrics.Counter(
+    "export_rows_total", "History rows streamed by /export/history", ("format",),
+))
+
+Row = Tuple
+
+
+def parquet_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def parse_bound(value: Optional[str], end: bool = False) -> Optional[int]:
+    """
+    日期範圍參數：ms timestamp 或 YYYY-MM-DD（UTC）。
+    end=True 且給的是日期時，回傳隔天 00:00（範圍為 [from, to)，to 當天整天都包含在內）。
+    """
+    if value is None or value == "":
+        return None
+    if value.lstrip("-").isdigit():
+        return int(value)
+    d = date.fromisoformat(value)
+    if end:
+        d += timedelta(days=1)
+    return int(datetime(d.year, d.month, d.day, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+# ---------- 讀取：分批 generator ----------
+def iter_history(
+    db: Session,
+    device_ids: Sequence[str],
+    start_ms: Optional[int] = None,
+    end_ms: Optional[int] = None,
+    categories: Sequence[str] = (),
+    batch: int = EXPORT_BATCH,
+) -> Iterator[List[Row]]:
+    """依 (session.startedAt, session.id, set.createdAt, set.id) 順序，每次產出一批列（tuple，欄位同 HISTORY_COLUMNS）。"""
+    S, Z, E = models.Session, models.SetRecord, models.Exercise
+    if not device_ids:
+        return
+
+    sess_q = (
+        select(S.startedAt, S.id, S.endedAt, S.status)
+        .where(S.deviceId.in_(list(device_ids)))
+        .where(S.deletedAt.is_(None))
+        .order_by(S.startedAt, S.id)
+        .limit(batch)
+    )
+    if start_ms is not None:
+        sess_q = sess_q.where(S.startedAt >= start_ms)
+    if end_ms is not None:
+        sess_q = sess_q.where(S.startedAt < end_ms)
+
+    sets_q = (
+        select(Z.sessionId, Z.id, Z.exerciseId, E.name, E.category, Z.weight, Z.reps, Z.unit, Z.rpe, Z.createdAt)
+        .where(Z.deletedAt.is_(None))
+        .order_by(Z.createdAt, Z.id)
+    )
+    if categories:
+        sets_q = sets_q.join(E, E.id == Z.exerciseId).where(E.category.in_(list(categories)))
+    else:
+        sets_q = sets_q.outerjoin(E, E.id == Z.exerciseId)
+
+    after: Optional[Tuple[int, str]] = None
+    while True:
+        q = sess_q if after is None else sess_q.where(tuple_(S.startedAt, S.id) > after)
+        sessions = db.execute(q).all()
+        if not sessions:
+            return
+        after = (sessions[-1][0], sessions[-1][1])
+
+        by_session = {}
+        for r in db.execute(sets_q.where(Z.sessionId.in_([s[1] for s in sessions]))):
+            by_session.setdefault(r[0], []).append(r)
+        # 結束讀取交易：下一批重新取 snapshot，不在整個下載期間占住 WAL
+        db.rollback()
+
+        rows: List[Row] = []
+        for started, sid, ended, status in sessions:
+            day = datetime.fromtimestamp(started / 1000, tz=timezone.utc).date().isoformat()
+            for _, set_id, ex_id, ex_name, category, weight, reps, unit, rpe, created in by_session.get(sid, ()):
+                rows.append((day, sid, started, ended, status, set_id, ex_id, ex_name, category,
+                             weight, reps, unit, rpe, created))
+        if rows:
+            yield rows
+        if len(sessions) < batch:
+            return
+
+
+# ---------- 編碼 ----------
+def _csv_chunks(batches: Iterable[List[Row]]) -> Iterator[bytes]:
+    buf = io.StringIO()
+    w = csv.writer(buf, lineterminator="\n")
+    w.writerow(HISTORY_COLUMNS)
+    for rows in batches:
+        w.writerows(rows)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+def _jsonl_chunks(batches: Iterable[List[Row]]) -> Iterator[bytes]:
+    for rows in batches:
+        yield "".join(
+            json.dumps(dict(zip(HISTORY_COLUMNS, r)), ensure_ascii=False, separators=(",", ":")) + "\n"
+            for r in rows
+        ).encode("utf-8")
+
+
+class _Sink:
+    """給 pyarrow ParquetWriter 的 file-like 物件；每寫完一個 row group 就把累積的 bytes 交出去。"""
+
+    closed = False
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._pos = 0
+
+    def write(self, data) -> int:
+        b = bytes(data)
+        self._parts.append(b)
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        out = b"".join(self._parts)
+        self._parts.clear()
+        return out
+
+
+def _parquet_chunks(batches: Iterable[List[Row]]) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("date", pa.string()), ("sessionId", pa.string()), ("sessionStartedAt", pa.int64()),
+        ("sessionEndedAt", pa.int64()), ("sessionStatus", pa.string()), ("setId", pa.string()),
+        ("exerciseId", pa.string()), ("exerciseName", pa.string()), ("category", pa.string()),
+        # weight / rpe：schemas 接受小數（2.5 kg 槓片、半格 RPE），SQLite 以 REAL 保存，不能宣告成整數
+        ("weight", pa.float64()), ("reps", pa.int64()), ("unit", pa.string()), ("rpe", pa.float64()),
+        ("createdAt", pa.int64()),
+    ])
+    sink = _Sink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        for rows in batches:
+            cols = list(zip(*rows))
+            table = pa.Table.from_arrays(
+                [pa.array(c, type=f.type) for c, f in zip(cols, schema)], schema=schema
+            )
+            writer.write_table(table)  # 每批一個 row group
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    except BaseException:
+        writer.close()
+        raise
+    writer.close()
+    yield sink.drain()
+
+
+def _gzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 → gzip header
+    for chunk in chunks:
+        out = z.compress(chunk)
+        if out:
+            yield out
+    yield z.flush()
+
+
+def _counted(batches: Iterable[List[Row]], fmt: str) -> Iterator[List[Row]]:
+    for rows in batches:
+        EXPORT_ROWS.inc(len(rows), fmt)
+        yield rows
+
+
+def encode(batches: Iterable[List[Row]], fmt: str, gzip: bool = True) -> Iterator[bytes]:
+    batches = _counted(batches, fmt)
+    if fmt == "parquet":
+        return _parquet_chunks(batches)
+    chunks = _csv_chunks(batches) if fmt == "csv" else _jsonl_chunks(batches)
+    return _gzip(chunks) if gzip else chunks
+
+
+def filename(fmt: str, gzip: bool) -> str:
+    name = f"history-{datetime.now(timezone.utc).date().isoformat()}.{fmt}"
+    return name + ".gz" if gzip and fmt != "parquet" else name
@@ -0,0 +1,224 @@
+# /server/hiit/media.py
+"""
+HIIT 媒體（public/hiit/media）的 content-addressed manifest。
+
+建置（重跑時只處理變更過的檔案）：
+  python -m server.hiit.media build                 # 產生 public/hiit/media-manifest.json
+  python -m server.hiit.media build --workers 8 --check   # --check：有重複內容或非 slug 檔名時 exit 1
+
+- 以 ProcessPoolExecutor 平行計算 sha256；(size, mtime_ns) 沒變的檔案直接沿用快取（.media-cache.json）
+- manifest 依 slug（與前端 getSlugFromLabel 相同規則）彙整 .webm / .mp4 / .webp 等 variants，
+  每個 variant 記錄 bytes、hash 與帶指紋的 URL（/hiit/media/<file>?v=<hash12>，內容變了 URL 就變，
+  可配合 _headers 的 immutable 長期快取）
+- 內容相同的不同檔案列在 duplicates
+
+伺服端：router 以 lookup_slug / exercise_slug 從 manifest 回答「動作 → 媒體」查詢，
+manifest 檔案更新（mtime 改變）時自動重新載入。
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+MEDIA_DIR = os.path.join(ROOT, "public", "hiit", "media")
+MEDIA_URL_PREFIX = "/hiit/media/"
+MANIFEST_PATH = os.getenv("HIIT_MEDIA_MANIFEST", os.path.join(ROOT, "public", "hiit", "media-manifest.json"))
+CACHE_PATH = os.path.join(ROOT, ".media-cache.json")
+
+FINGERPRINT_LEN = 12
+CHUNK = 1 << 20
+
+# 播放端偏好順序：影片先 webm（較小）再 mp4；圖片作為 poster
+MIME_TYPES = {
+    ".webm": ("video/webm", "video"),
+    ".mp4": ("video/mp4", "video"),
+    ".webp": ("image/webp", "image"),
+    ".jpg": ("image/jpeg", "image"),
+    ".png": ("image/png", "image"),
+}
+VARIANT_ORDER = {ext: i for i, ext in enumerate(MIME_TYPES)}
+
+
+def slugify(label: str) -> str:
+    """與 app/(hiit)/hiit/play/page.tsx 的 getSlugFromLabel 相同：取第一行（英文名）轉小寫 slug。"""
+    english = (label or "").split("\n")[0].strip()
+    s = english.lower().replace("'", "").replace("’", "")
+    return re.sub(r"[^a-z0-9]+", "-", s).strip("-")
+
+
+# ---------- 建置 ----------
+def hash_file(path: str) -> Tuple[str, str]:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK), b""):
+            h.update(block)
+    return path, h.hexdigest()
+
+
+def _load_json(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_json(path: str, data: dict) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp, path)
+
+
+def scan(media_dir: str = MEDIA_DIR, cache_path: str = CACHE_PATH, workers: Optional[int] = None) -> Tuple[Dict[str, dict], int]:
+    """回傳 (檔名 → {bytes, mtime_ns, hash}, 重新計算 hash 的檔案數)。"""
+    cache = _load_json(cache_path).get("files", {})
+    files: Dict[str, dict] = {}
+    todo: List[str] = []
+    for name in sorted(os.listdir(media_dir)):
+        path = os.path.join(media_dir, name)
+        if name.startswith(".") or not os.path.isfile(path):
+            continue
+        st = os.stat(path)
+        entry = {"bytes": st.st_size, "mtime_ns": st.st_mtime_ns}
+        old = cache.get(name)
+        if old and old.get("bytes") == st.st_size and old.get("mtime_ns") == st.st_mtime_ns and old.get("hash"):
+            entry["hash"] = old["hash"]
+        else:
+            todo.append(path)
+        files[name] = entry
+
+    if todo:
+        if workers == 1 or len(todo) == 1:
+            results = [hash_file(p) for p in todo]
+        else:
+            n = workers or os.cpu_count() or 1
+            with ProcessPoolExecutor(max_workers=n) as ex:
+                results = list(ex.map(hash_file, todo, chunksize=max(1, len(todo) // (4 * n))))
+        for path, digest in results:
+            files[os.path.basename(path)]["hash"] = digest
+
+    _write_json(cache_path, {"files": files})
+    return files, len(todo)
+
+
+def build_manifest(files: Dict[str, dict]) -> dict:
+    assets: Dict[str, dict] = {}
+    by_hash: Dict[str, List[str]] = {}
+    non_slug: List[str] = []
+    total = 0
+    for name, info in files.items():
+        stem, ext = os.path.splitext(name)
+        ext = ext.lower()
+        if ext not in MIME_TYPES:
+            continue
+        slug = slugify(stem)
+        if slug != stem:
+            non_slug.append(name)
+        mime, kind = MIME_TYPES[ext]
+        digest = info["hash"]
+        variant = {
+            "file": name,
+            "ext": ext[1:],
+            "type": mime,
+            "kind": kind,
+            "bytes": info["bytes"],
+            "hash": f"sha256-{digest}",
+            "url": f"{MEDIA_URL_PREFIX}{name}?v={digest[:FINGERPRINT_LEN]}",
+        }
+        assets.setdefault(slug, {"slug": slug, "variants": []})["variants"].append(variant)
+        by_hash.setdefault(digest, []).append(name)
+        total += info["bytes"]
+
+    for a in assets.values():
+        a["variants"].sort(key=lambda v: VARIANT_ORDER["." + v["ext"]])
+        a["bytes"] = sum(v["bytes"] for v in a["variants"])
+
+    duplicates = [
+        {"hash": f"sha256-{h}", "files": sorted(names)}
+        for h, names in sorted(by_hash.items())
+        if len(names) > 1
+    ]
+    return {
+        "version": 1,
+        "generatedAt": int(time.time()),
+        "totalBytes": total,
+        "assets": dict(sorted(assets.items())),
+        "duplicates": duplicates,
+        "nonSlugFiles": sorted(non_slug),
+    }
+
+
+# ---------- 伺服端查詢 ----------
+_loaded: Tuple[Optional[float], dict] = (None, {})
+_load_lock = threading.Lock()
+
+
+def load_manifest(path: str = MANIFEST_PATH) -> dict:
+    """讀取 manifest（檔案 mtime 改變才重讀）；檔案不存在時回傳空 manifest。"""
+    global _loaded
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return {}
+    if _loaded[0] != mtime:
+        with _load_lock:
+            if _loaded[0] != mtime:
+                _loaded = (mtime, _load_json(path))
+    return _loaded[1]
+
+
+def lookup_slug(slug: str) -> Optional[dict]:
+    return load_manifest().get("assets", {}).get(slug)
+
+
+def exercise_slug(exercise: dict) -> str:
+    return slugify(exercise.get("name", ""))
+
+
+# ---------- CLI ----------
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Build the content-addressed HIIT media manifest")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build")
+    b.add_argument("--media-dir", default=MEDIA_DIR)
+    b.add_argument("--out", default=MANIFEST_PATH)
+    b.add_argument("--cache", default=CACHE_PATH)
+    b.add_argument("--workers", type=int, default=None, help="hash 的 process 數（預設 CPU 數）")
+    b.add_argument("--check", action="store_true", help="有重複內容或非 slug 檔名時 exit code = 1")
+    args = ap.parse_args(argv)
+
+    t0 = time.perf_counter()
+    files, hashed = scan(args.media_dir, args.cache, args.workers)
+    manifest = build_manifest(files)
+
+    # 內容沒變就不改寫（避免 generatedAt 造成無意義的 diff）
+    old = _load_json(args.out)
+    if {k: v for k, v in old.items() if k != "generatedAt"} != {k: v for k, v in manifest.items() if k != "generatedAt"}:
+        _write_json(args.out, manifest)
+        status = "written"
+    else:
+        status = "unchanged"
+
+    print(f"[media] {len(files)} files ({hashed} hashed, {len(files) - hashed} cached), "
+          f"{len(manifest['assets'])} slugs, {manifest['totalBytes'] / 1e6:.1f} MB "
+          f"in {time.perf_counter() - t0:.2f}s → {args.out} ({status})")
+    for d in manifest["duplicates"]:
+        print(f"[media] duplicate content: {', '.join(d['files'])}")
+    for name in manifest["nonSlugFiles"]:
+        print(f"[media] not a slug filename (run fix_media_names.py): {name}")
+    if args.check and (manifest["duplicates"] or manifest["nonSlugFiles"]):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
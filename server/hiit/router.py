@@ -1,8 +1,11 @@
 # /server/hiit/router.py
 from fastapi import APIRouter, HTTPException, Query
-from pydantic import BaseModel, Field
-from typing import List, Literal, Optional, Dict
-import uuid, datetime, json, os
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+from typing import Any, List, Literal, Optional, Dict, Tuple
+import uuid, datetime, json, os, threading
+
+from . import media
 
 hiit = APIRouter(prefix="/api/hiit", tags=["hiit"])
 
@@ -91,6 +94,9 @@ DB: Dict[str, Dict[str, dict]] = {
     "exercises": {},
     "workouts": {},
 }
+# 所有寫入路由（單筆與批次）共用：讀現值 → 修改 → 寫回整段持有，
+# 避免批次以舊值蓋掉並行的單筆修改，或讓剛被硬刪除的項目復活
+_WRITE_LOCK = threading.Lock()
 
 # ---------- Seed (exercises) ----------
 def _clean_seed_item(it: dict) -> dict:
@@ -100,7 +106,8 @@ def _clean_seed_item(it: dict) -> dict:
     data.pop("defaultMode", None)  # 我們固定帶入 "time"
     return data
 
-def _seed_from_json():
+def load_seed():
+    """載入 seed_exercises.json（由 server.app 的 lifespan 在啟動時呼叫）。"""
     if DB["exercises"]:  # 已有資料就不覆蓋
         return
     base = os.path.dirname(os.path.abspath(__file__))
@@ -116,8 +123,6 @@ def _seed_from_json():
     except Exception as e:
         print("[HIIT] seed load skipped:", e)
 
-_seed_from_json()
-
 # ---------- Utils: filtering ----------
 def _text_hit(hay: str, q: str) -> bool:
     # 子字串包含（substring match）
@@ -191,39 +196,43 @@ def get_exercise(eid: str):
 @hiit.post("/exercises")
 def create_exercise(dto: HiitExerciseCreate):
     eid = _id()
-    ex = HiitExercise(id=eid, defaultMode="time", **dto.model_dump())
-    DB["exercises"][eid] = ex.model_dump()
-    return DB["exercises"][eid]
+    ex = HiitExercise(id=eid, defaultMode="time", **dto.model_dump()).model_dump()
+    with _WRITE_LOCK:
+        DB["exercises"][eid] = ex
+    return ex
 
 @hiit.put("/exercises/{eid}")
 def update_exercise(eid: str, dto: HiitExerciseUpdate):
-    it = DB["exercises"].get(eid)
-    if not it or it.get("deletedAt"):
-        raise HTTPException(404, "exercise not found")
-    data = dto.model_dump(exclude_unset=True)
-    it.update(data)
-    DB["exercises"][eid] = it
-    return it
+    with _WRITE_LOCK:
+        it = DB["exercises"].get(eid)
+        if not it or it.get("deletedAt"):
+            raise HTTPException(404, "exercise not found")
+        data = dto.model_dump(exclude_unset=True)
+        it.update(data)
+        DB["exercises"][eid] = it
+        return it
 
 @hiit.post("/exercises/{eid}/restore")
 def restore_exercise(eid: str):
-    it = DB["exercises"].get(eid)
-    if not it:
-        raise HTTPException(404, "exercise not found")
-    it["deletedAt"] = None
-    DB["exercises"][eid] = it
-    return {"ok": True}
+    with _WRITE_LOCK:
+        it = DB["exercises"].get(eid)
+        if not it:
+            raise HTTPException(404, "exercise not found")
+        it["deletedAt"] = None
+        DB["exercises"][eid] = it
+        return {"ok": True}
 
 @hiit.delete("/exercises/{eid}")
 def delete_exercise(eid: str, hard: bool = Query(False)):
-    it = DB["exercises"].get(eid)
-    if not it:
-        raise HTTPException(404, "exercise not found")
-    if hard:
-        del DB["exercises"][eid]
-        return {"ok": True, "hard": True}
-    it["deletedAt"] = _now_iso()
-    return {"ok": True, "hard": False}
+    with _WRITE_LOCK:
+        it = DB["exercises"].get(eid)
+        if not it:
+            raise HTTPException(404, "exercise not found")
+        if hard:
+            del DB["exercises"][eid]
+            return {"ok": True, "hard": True}
+        it["deletedAt"] = _now_iso()
+        return {"ok": True, "hard": False}
 
 # 開發用：強制重載 seed
 @hiit.post("/dev/seed-exercises")
@@ -235,13 +244,14 @@ def dev_seed_exercises(force: bool = True):
     try:
         with open(path, "r", encoding="utf-8") as f:
             items = json.load(f)
-        if force:
-            DB["exercises"].clear()
-        for it in items:
-            data = _clean_seed_item(it)
-            eid = _id()
-            DB["exercises"][eid] = HiitExercise(id=eid, defaultMode="time", **data).model_dump()
-        return {"ok": True, "count": len(DB["exercises"])}
+        with _WRITE_LOCK:
+            if force:
+                DB["exercises"].clear()
+            for it in items:
+                data = _clean_seed_item(it)
+                eid = _id()
+                DB["exercises"][eid] = HiitExercise(id=eid, defaultMode="time", **data).model_dump()
+            return {"ok": True, "count": len(DB["exercises"])}
     except Exception as e:
         raise HTTPException(500, f"failed to load seed: {e}")
 
@@ -262,27 +272,223 @@ def get_workout(wid: str):
 @hiit.post("/workouts")
 def create_workout(dto: HiitWorkoutCreate):
     wid = _id()
-    w = HiitWorkout(id=wid, **dto.model_dump())
-    DB["workouts"][wid] = w.model_dump()
-    return DB["workouts"][wid]
+    w = HiitWorkout(id=wid, **dto.model_dump()).model_dump()
+    with _WRITE_LOCK:
+        DB["workouts"][wid] = w
+    return w
 
 @hiit.put("/workouts/{wid}")
 def update_workout(wid: str, dto: HiitWorkoutUpdate):
-    it = DB["workouts"].get(wid)
-    if not it or it.get("deletedAt"):
-        raise HTTPException(404, "workout not found")
-    data = dto.model_dump(exclude_unset=True)
-    it.update(data)
-    DB["workouts"][wid] = it
-    return it
+    with _WRITE_LOCK:
+        it = DB["workouts"].get(wid)
+        if not it or it.get("deletedAt"):
+            raise HTTPException(404, "workout not found")
+        data = dto.model_dump(exclude_unset=True)
+        it.update(data)
+        DB["workouts"][wid] = it
+        return it
 
 @hiit.delete("/workouts/{wid}")
 def delete_workout(wid: str, hard: bool = Query(False)):
-    it = DB["workouts"].get(wid)
+    with _WRITE_LOCK:
+        it = DB["workouts"].get(wid)
+        if not it:
+            raise HTTPException(404, "workout not found")
+        if hard:
+            del DB["workouts"][wid]
+            return {"ok": True, "hard": True}
+        it["deletedAt"] = _now_iso()
+        return {"ok": True, "hard": False}
+
+
+# ---------- Batch Routes ----------
+# 一次送多筆（匯入 presets / 整理動作庫），避免數百次 round trip：
+# - 整個陣列以 TypeAdapter 一次驗證，錯誤依索引回報在各筆結果
+# - 先在副本上算好所有變更，再一次寫回 DB（atomic=true 時任一筆失敗就整批不套用）
+# - 每筆回傳 status：201 建立 / 200 成功 / 404 不存在 / 409 同批重複 id / 422 驗證失敗 / 424 因整批中止未套用
+HIIT_BATCH_MAX = int(os.getenv("HIIT_BATCH_MAX", "1000"))
+
+
+class HiitExerciseBatchUpdate(HiitExerciseUpdate):
+    id: str
+
+class HiitWorkoutBatchUpdate(HiitWorkoutUpdate):
+    id: str
+
+class BatchItems(BaseModel):
+    items: List[Any] = Field(default_factory=list)
+    atomic: bool = True
+
+class BatchIds(BaseModel):
+    ids: List[str] = Field(default_factory=list)
+    atomic: bool = True
+    hard: bool = False   # 只用於 delete
+
+_ADAPTERS: Dict[type, TypeAdapter] = {}
+
+def _validate_all(model: type, items: List[Any]) -> Tuple[Dict[int, Any], Dict[int, str]]:
+    """一次驗證整個陣列；回傳 (索引 → model, 索引 → 錯誤訊息)。"""
+    if len(items) > HIIT_BATCH_MAX:
+        raise HTTPException(413, f"batch too large (max {HIIT_BATCH_MAX})")
+    ta = _ADAPTERS.get(model)
+    if ta is None:
+        ta = _ADAPTERS[model] = TypeAdapter(List[model])
+    try:
+        return dict(enumerate(ta.validate_python(items))), {}
+    except ValidationError as e:
+        errors: Dict[int, str] = {}
+        for err in e.errors():
+            loc = err.get("loc") or ()
+            if loc and isinstance(loc[0], int):
+                field = ".".join(str(x) for x in loc[1:]) or "item"
+                errors.setdefault(loc[0], f"{field}: {err.get('msg')}")
+        ok_idx = [i for i in range(len(items)) if i not in errors]
+        # 只有在有錯誤時才需要第二次驗證（取出其餘有效項目）
+        return dict(zip(ok_idx, ta.validate_python([items[i] for i in ok_idx]))), errors
+
+def _finish(table: str, results: List[dict], staged: Dict[str, Optional[dict]], atomic: bool):
+    """staged: id → 新內容（None 代表硬刪除）；全部檢查完才一次寫回。呼叫端須持有 _WRITE_LOCK。"""
+    failed = any(r["status"] >= 400 for r in results)
+    if failed and atomic:
+        for r in results:
+            if r["status"] < 400:
+                r.update(status=424, error="not applied: another item in the batch failed")
+                r.pop("item", None)
+        return JSONResponse(status_code=422, content={"ok": False, "applied": 0, "results": results})
+    store = DB[table]
+    for key in [k for k, v in staged.items() if v is None]:
+        store.pop(key, None)
+    store.update({k: v for k, v in staged.items() if v is not None})
+    applied = sum(1 for r in results if r["status"] < 400)
+    return {"ok": not failed, "applied": applied, "results": results}
+
+def _batch_create(table: str, model: type, build, body: BatchItems):
+    valid, errors = _validate_all(model, body.items)
+    results, staged = [], {}
+    for i in range(len(body.items)):
+        if i in errors:
+            results.append({"index": i, "status": 422, "error": errors[i]})
+            continue
+        new_id = _id()
+        staged[new_id] = build(new_id, valid[i])
+        results.append({"index": i, "status": 201, "id": new_id, "item": staged[new_id]})
+    with _WRITE_LOCK:
+        return _finish(table, results, staged, body.atomic)
+
+def _batch_update(table: str, model: type, final_model: type, body: BatchItems):
+    valid, errors = _validate_all(model, body.items)
+    results, staged = [], {}
+    # 讀現值、合併、寫回都在同一把鎖內，否則兩個批次會以同一份舊值各自合併而互相蓋掉
+    with _WRITE_LOCK:
+        store = DB[table]
+        for i in range(len(body.items)):
+            if i in errors:
+                results.append({"index": i, "status": 422, "error": errors[i]})
+                continue
+            dto = valid[i]
+            cur = store.get(dto.id)
+            if dto.id in staged:
+                results.append({"index": i, "id": dto.id, "status": 409, "error": "duplicate id in batch"})
+            elif not cur or cur.get("deletedAt"):
+                results.append({"index": i, "id": dto.id, "status": 404, "error": "not found"})
+            else:
+                data = dto.model_dump(exclude_unset=True)
+                data.pop("id", None)
+                try:
+                    # 合併後整筆再驗證一次（例如把必填欄位設成 null）
+                    staged[dto.id] = final_model(**{**cur, **data}).model_dump()
+                except ValidationError as e:
+                    err = e.errors()[0]
+                    results.append({"index": i, "id": dto.id, "status": 422,
+                                    "error": f"{'.'.join(str(x) for x in err.get('loc', ()))}: {err.get('msg')}"})
+                    continue
+                results.append({"index": i, "id": dto.id, "status": 200, "item": staged[dto.id]})
+        return _finish(table, results, staged, body.atomic)
+
+def _batch_flag(table: str, body: BatchIds, delete: bool):
+    if len(body.ids) > HIIT_BATCH_MAX:
+        raise HTTPException(413, f"batch too large (max {HIIT_BATCH_MAX})")
+    now = _now_iso()
+    results, staged = [], {}
+    with _WRITE_LOCK:
+        store = DB[table]
+        for i, key in enumerate(body.ids):
+            cur = store.get(key)
+            if key in staged:
+                results.append({"index": i, "id": key, "status": 409, "error": "duplicate id in batch"})
+            elif not cur:
+                results.append({"index": i, "id": key, "status": 404, "error": "not found"})
+            else:
+                if delete and body.hard:
+                    staged[key] = None
+                else:
+                    staged[key] = {**cur, "deletedAt": now if delete else None}
+                results.append({"index": i, "id": key, "status": 200})
+        return _finish(table, results, staged, body.atomic)
+
+@hiit.post("/batch/exercises")
+def batch_create_exercises(body: BatchItems):
+    return _batch_create(
+        "exercises", HiitExerciseCreate,
+        lambda eid, dto: HiitExercise(id=eid, defaultMode="time", **dto.model_dump()).model_dump(),
+        body,
+    )
+
+@hiit.put("/batch/exercises")
+def batch_update_exercises(body: BatchItems):
+    return _batch_update("exercises", HiitExerciseBatchUpdate, HiitExercise, body)
+
+@hiit.post("/batch/exercises/delete")
+def batch_delete_exercises(body: BatchIds):
+    return _batch_flag("exercises", body, delete=True)
+
+@hiit.post("/batch/exercises/restore")
+def batch_restore_exercises(body: BatchIds):
+    return _batch_flag("exercises", body, delete=False)
+
+@hiit.post("/batch/workouts")
+def batch_create_workouts(body: BatchItems):
+    return _batch_create(
+        "workouts", HiitWorkoutCreate,
+        lambda wid, dto: HiitWorkout(id=wid, **dto.model_dump()).model_dump(),
+        body,
+    )
+
+@hiit.put("/batch/workouts")
+def batch_update_workouts(body: BatchItems):
+    return _batch_update("workouts", HiitWorkoutBatchUpdate, HiitWorkout, body)
+
+@hiit.post("/batch/workouts/delete")
+def batch_delete_workouts(body: BatchIds):
+    return _batch_flag("workouts", body, delete=True)
+
+@hiit.post("/batch/workouts/restore")
+def batch_restore_workouts(body: BatchIds):
+    return _batch_flag("workouts", body, delete=False)
+
+
+# ---------- Media（public/hiit/media-manifest.json） ----------
+# 由 python -m server.hiit.media build 產生；客戶端以此取得帶指紋的 URL，不再自行猜檔名
+@hiit.get("/media")
+def media_manifest():
+    m = media.load_manifest()
+    if not m:
+        raise HTTPException(404, "media manifest not built")
+    return m
+
+@hiit.get("/media/{slug}")
+def media_by_slug(slug: str):
+    it = media.lookup_slug(slug)
     if not it:
-        raise HTTPException(404, "workout not found")
-    if hard:
-        del DB["workouts"][wid]
-        return {"ok": True, "hard": True}
-    it["deletedAt"] = _now_iso()
-    return {"ok": True, "hard": False}
\ No newline at end of file
+        raise HTTPException(404, "media not found")
+    return it
+
+@hiit.get("/exercises/{eid}/media")
+def exercise_media(eid: str):
+    it = DB["exercises"].get(eid)
+    if not it or it.get("deletedAt"):
+        raise HTTPException(404, "exercise not found")
+    slug = media.exercise_slug(it)
+    found = media.lookup_slug(slug)
+    return {"exerciseId": eid, "slug": slug, "variants": found["variants"] if found else []}
+
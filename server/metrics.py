@@ -0,0 +1,257 @@
+# File: server/metrics.py
+"""
+輕量 Prometheus 指標（不依賴 prometheus_client）：
+
+- MetricsMiddleware：每個 request 的延遲、request/response body 大小、SQL 次數與總時間
+- instrument_engine：以 SQLAlchemy engine events 計算 SQL 次數/時間（歸屬到目前 request）
+- render()：輸出 Prometheus text exposition format（/metrics）
+
+路由 label 使用路由樣板（例如 /api/hiit/exercises/{eid}），避免 label 基數爆炸。
+"""
+import bisect
+import contextvars
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def collect(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, *labelvalues: str) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets: Iterable[float], labelnames=()):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [每個 bucket 的（非累積）次數..., +Inf 次數], sum
+        self._values: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            cur = self._values.get(labelvalues)
+            if cur is None:
+                cur = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            cur[0][idx] += 1
+            cur[1] += value
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(c), s)) for k, (c, s) in self._values.items())
+        out = []
+        for k, (counts, total) in items:
+            acc = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                acc += n
+                le = 'le="%s"' % _fmt(bound)
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, k, le)} {acc}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, k)} {_fmt(total)}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, k)} {acc}")
+        return out
+
+
+class GaugeFunc(_Metric):
+    """採集時才呼叫 fn 取值（例如 in-memory store 大小），平常零成本。"""
+    kind = "gauge"
+
+    def __init__(self, name, help, labelnames=(), fn: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None):
+        super().__init__(name, help, labelnames)
+        self.fn = fn
+
+    def set_function(self, fn: Callable[[], Dict[Tuple[str, ...], float]]) -> None:
+        self.fn = fn
+
+    def collect(self) -> List[str]:
+        if self.fn is None:
+            return []
+        return [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in sorted(self.fn().items())]
+
+
+REGISTRY: List[_Metric] = []
+
+
+def register(m):
+    """加入 REGISTRY（其他模組的指標也用這個註冊，/metrics 才會輸出）。"""
+    REGISTRY.append(m)
+    return m
+
+
+# ---------- 指標定義 ----------
+REQUEST_LATENCY = register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    LATENCY_BUCKETS, ("method", "route", "status"),
+))
+REQUEST_SIZE = register(Histogram(
+    "http_request_size_bytes", "HTTP request body size", SIZE_BUCKETS, ("method", "route"),
+))
+RESPONSE_SIZE = register(Histogram(
+    "http_response_size_bytes", "HTTP response body size", SIZE_BUCKETS, ("method", "route"),
+))
+REQUEST_SQL_COUNT = register(Histogram(
+    "http_request_sql_statements", "SQL statements executed per request", COUNT_BUCKETS, ("method", "route"),
+))
+REQUEST_SQL_TIME = register(Histogram(
+    "http_request_sql_duration_seconds", "Total SQL time per request", LATENCY_BUCKETS, ("method", "route"),
+))
+SQL_STATEMENTS = register(Counter(
+    "sql_statements_total", "SQL statements executed (including outside requests)",
+))
+SQL_TIME = register(Counter(
+    "sql_duration_seconds_total", "Total SQL execution time (including outside requests)",
+))
+SYNC_ROWS = register(Histogram(
+    "sync_rows", "Rows pushed / pulled per /sync call", COUNT_BUCKETS, ("direction",),
+))
+HIIT_ITEMS = register(GaugeFunc(
+    "hiit_store_items", "Items in the HIIT in-memory store", ("kind",),
+))
+
+
+def render() -> str:
+    lines: List[str] = []
+    for m in REGISTRY:
+        body = m.collect()
+        if body:
+            lines.extend(m.header())
+            lines.extend(body)
+    return "\n".join(lines) + "\n"
+
+
+# ---------- 每個 request 的 SQL 統計 ----------
+class _RequestStats:
+    __slots__ = ("sql_count", "sql_time")
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_time = 0.0
+
+
+# contextvar 會隨 anyio threadpool 一起複製，同步路由在 worker thread 內也能累加到同一物件
+_current: contextvars.ContextVar[Optional[_RequestStats]] = contextvars.ContextVar("metrics_request", default=None)
+
+
+def instrument_engine(engine) -> None:
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        # 開始時間放在這條敘述的 execution context 上：敘述失敗時 after 不會觸發，
+        # 若放在連線的 info 上會一直殘留在 pooled 連線裡
+        context._metrics_t0 = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        t0 = getattr(context, "_metrics_t0", None)
+        if t0 is None:
+            return
+        elapsed = time.perf_counter() - t0
+        SQL_STATEMENTS.inc()
+        SQL_TIME.inc(elapsed)
+        stats = _current.get()
+        if stats is not None:
+            stats.sql_count += 1
+            stats.sql_time += elapsed
+
+
+# ---------- ASGI middleware ----------
+def _route_of(scope) -> str:
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    return path or "<unmatched>"
+
+
+class MetricsMiddleware:
+    """純 ASGI middleware（不經 BaseHTTPMiddleware），每個 request 只多幾次計數。"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = _RequestStats()
+        token = _current.set(stats)
+        sizes = [0, 0]  # request, response
+        status = [500]
+
+        async def _receive():
+            msg = await receive()
+            if msg["type"] == "http.request":
+                sizes[0] += len(msg.get("body", b""))
+            return msg
+
+        async def _send(msg):
+            if msg["type"] == "http.response.start":
+                status[0] = msg["status"]
+            elif msg["type"] == "http.response.body":
+                sizes[1] += len(msg.get("body", b""))
+            await send(msg)
+
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, _receive, _send)
+        finally:
+            elapsed = time.perf_counter() - t0
+            _current.reset(token)
+            method, route = scope["method"], _route_of(scope)
+            REQUEST_LATENCY.observe(elapsed, method, route, str(status[0]))
+            REQUEST_SIZE.observe(sizes[0], method, route)
+            RESPONSE_SIZE.observe(sizes[1], method, route)
+            REQUEST_SQL_COUNT.observe(stats.sql_count, method, route)
+            REQUEST_SQL_TIME.observe(stats.sql_time, method, route)
@@ -0,0 +1,112 @@
+# File: server/migrate.py
+"""
+輕量 schema migration runner。
+
+- migrations 放在 server/migrations/NNN_name.sql，依 NNN 由小到大套用
+- 已套用的版本記錄在 schema_migrations（version / name / applied_at / duration_ms）
+- 每條敘述各自一個短交易，並先切到 WAL 模式：建大 index 時只佔寫鎖，
+  讀取（sync pull、health）不會被擋住整個 migration 的時間
+- 因為逐條提交，migration 內的敘述必須可重複執行（CREATE ... IF NOT EXISTS 等），
+  中途中斷後重新啟動會從頭再跑一次該檔
+
+Base.metadata.create_all 仍負責建立缺少的資料表；這裡只處理之後的演進（index、欄位、資料修正）。
+001_add_hiit_tables.sql 早於這個 runner，建的 hiit_* 表沒有任何程式使用（HIIT 資料在記憶體中），
+因此由 FIRST_MANAGED_VERSION 起才套用，不會在 sync.db 與每個 shard 建出空表。
+"""
+import logging
+import os
+import re
+import sqlite3
+import time
+from typing import List, Tuple
+
+log = logging.getLogger("sync-api")
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+META_TABLE = "schema_migrations"
+BUSY_TIMEOUT_MS = 30_000
+FIRST_MANAGED_VERSION = 2   # 之前的檔案屬於 runner 之前的手動 SQL，不自動套用
+
+_NAME_RE = re.compile(r"^(\d+)_([\w\-]+)\.sql$")
+
+
+def discover(directory: str = MIGRATIONS_DIR, since: int = FIRST_MANAGED_VERSION) -> List[Tuple[int, str, str]]:
+    """回傳 version >= since 的 [(version, name, path)]，依 version 排序。"""
+    out = []
+    for fn in os.listdir(directory):
+        m = _NAME_RE.match(fn)
+        if m:
+            out.append((int(m.group(1)), m.group(2), os.path.join(directory, fn)))
+    out.sort()
+    versions = [v for v, _, _ in out]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"duplicate migration versions in {directory}")
+    return [m for m in out if m[0] >= since]
+
+
+def split_statements(sql: str) -> List[str]:
+    """以 sqlite3.complete_statement 切分（字串中的分號不會被誤切），並略過純註解片段。"""
+    out, buf = [], []
+    for line in sql.splitlines(keepends=True):
+        buf.append(line)
+        chunk = "".join(buf)
+        if sqlite3.complete_statement(chunk):
+            body = "\n".join(
+                ln for ln in chunk.splitlines() if not ln.strip().startswith("--")
+            ).strip()
+            if body and body != ";":
+                out.append(body)
+            buf = []
+    tail = "".join(buf).strip()
+    if tail and not all(ln.strip().startswith("--") or not ln.strip() for ln in tail.splitlines()):
+        raise ValueError(f"incomplete SQL statement at end of migration: {tail[:80]!r}")
+    return out
+
+
+def run_migrations(engine, directory: str = MIGRATIONS_DIR) -> List[str]:
+    """套用尚未執行的 migrations，回傳本次套用的檔名清單。"""
+    raw = engine.raw_connection()
+    dbapi = raw.driver_connection
+    old_isolation = dbapi.isolation_level
+    dbapi.isolation_level = None  # 自行控制 BEGIN / COMMIT
+    applied_now: List[str] = []
+    try:
+        cur = dbapi.cursor()
+        cur.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        cur.execute("PRAGMA journal_mode = WAL")
+        cur.execute(
+            f"CREATE TABLE IF NOT EXISTS {META_TABLE} ("
+            " version INTEGER PRIMARY KEY,"
+            " name TEXT NOT NULL,"
+            " applied_at DATETIME DEFAULT CURRENT_TIMESTAMP,"
+            " duration_ms INTEGER)"
+        )
+        done = {row[0] for row in cur.execute(f"SELECT version FROM {META_TABLE}")}
+
+        for version, name, path in discover(directory):
+            if version in done:
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                statements = split_statements(f.read())
+            t0 = time.perf_counter()
+            for stmt in statements:
+                cur.execute("BEGIN IMMEDIATE")
+                try:
+                    cur.execute(stmt)
+                    cur.execute("COMMIT")
+                except Exception:
+                    cur.execute("ROLLBACK")
+                    log.exception("migration %03d_%s failed on: %s", version, name, stmt)
+                    raise
+            ms = int((time.perf_counter() - t0) * 1000)
+            cur.execute(
+                f"INSERT OR IGNORE INTO {META_TABLE} (version, name, duration_ms) VALUES (?, ?, ?)",
+                (version, name, ms),
+            )
+            applied_now.append(os.path.basename(path))
+            log.info("migration applied: %03d_%s (%d statements, %d ms)", version, name, len(statements), ms)
+        cur.close()
+    finally:
+        dbapi.isolation_level = old_isolation
+        raw.close()
+    return applied_now
@@ -0,0 +1,18 @@
+-- /server/migrations/002_perf_indexes.sql
+-- 熱點查詢所需 index（由 server/migrate.py 於啟動時套用，每條敘述各自一個短交易）
+-- 注意：必須可重複執行（IF NOT EXISTS），中途中斷後重跑不會出錯
+
+-- continue_latest_session / get_recent_exercises：WHERE deviceId = ? ORDER BY updatedAt DESC
+CREATE INDEX IF NOT EXISTS ix_sessions_device_updated ON sessions ("deviceId", "updatedAt");
+
+-- get_recent_exercises：WHERE sessionId IN (...) ORDER BY updatedAt DESC
+CREATE INDEX IF NOT EXISTS ix_sets_session_updated ON sets ("sessionId", "updatedAt");
+
+-- register-device：get_token_by_device
+CREATE INDEX IF NOT EXISTS ix_tokens_device_id ON tokens (device_id);
+
+-- 使用者 → 裝置
+CREATE INDEX IF NOT EXISTS ix_devices_user_id ON devices (user_id);
+
+-- 更新統計資料，讓 planner 選到新 index
+ANALYZE;
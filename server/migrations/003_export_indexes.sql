@@ -0,0 +1,5 @@
+-- /server/migrations/003_export_indexes.sql
+-- /export/history：WHERE deviceId IN (...) AND startedAt 範圍，依 (startedAt, id) 分批
+CREATE INDEX IF NOT EXISTS ix_sessions_device_started ON sessions ("deviceId", "startedAt");
+
+ANALYZE;
@@ -0,0 +1,97 @@
+# File: server/notify.py
+"""
+版本變更通知（long-poll 用）。
+
+寫入路徑（/sync push、/sessions/continue）commit 後呼叫 publish(version)，
+在 process 內直接喚醒等待中的 /sync/wait 連線；等待期間不查 DB。
+
+版本號在同一個資料庫內遞增（見 utils.get_current_version）：不分片時只有 GLOBAL_SCOPE，
+分片模式下每個 shard 是一個 scope（見 shards.scope_for）。
+版本前進時也會呼叫 subscribe() 註冊的 listener（例如 pullcache 清除過期回應）。
+注意：通知只在單一 process 內有效，多 worker 部署時其他 worker 寫入不會喚醒這裡的等待者
+（等待逾時後客戶端照常走 /sync，不會漏資料，只是延遲較高）。
+"""
+import asyncio
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from . import metrics
+
+GLOBAL_SCOPE = "global"
+
+_Waiter = Tuple[asyncio.AbstractEventLoop, asyncio.Future, int]
+
+
+class VersionNotifier:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions: Dict[str, int] = {}
+        self._waiters: Dict[str, List[_Waiter]] = {}
+        self._listeners: List[Callable[[int, str], None]] = []
+
+    def subscribe(self, fn: Callable[[int, str], None]) -> None:
+        """版本前進時呼叫 fn(version, scope)（在 publish 的呼叫端 thread 執行，需快速返回）。"""
+        self._listeners.append(fn)
+
+    def current(self, scope: str = GLOBAL_SCOPE) -> Optional[int]:
+        """已知的最新版本；尚未由 DB 初始化時為 None。"""
+        return self._versions.get(scope)
+
+    def prime(self, version: int, scope: str = GLOBAL_SCOPE) -> int:
+        """以 DB 讀到的版本初始化（不會倒退）。"""
+        with self._lock:
+            cur = max(self._versions.get(scope, 0), version)
+            self._versions[scope] = cur
+            return cur
+
+    def publish(self, version: int, scope: str = GLOBAL_SCOPE) -> None:
+        """可在任何 thread 呼叫（例如 commit queue 或 threadpool 內的同步路由）。"""
+        with self._lock:
+            if version <= self._versions.get(scope, 0):
+                return
+            self._versions[scope] = version
+            waiters = self._waiters.get(scope, [])
+            wake = [w for w in waiters if w[2] < version]
+            if wake:
+                self._waiters[scope] = [w for w in waiters if w[2] >= version]
+        for fn in self._listeners:
+            fn(version, scope)
+        for loop, fut, _ in wake:
+            loop.call_soon_threadsafe(_resolve, fut, version)
+
+    async def wait(self, since: int, timeout: float, scope: str = GLOBAL_SCOPE) -> int:
+        """等到版本超過 since 或逾時，回傳當下已知的版本。"""
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        waiter = (loop, fut, since)
+        with self._lock:
+            cur = self._versions.get(scope, 0)
+            if cur > since:
+                return cur
+            self._waiters.setdefault(scope, []).append(waiter)
+        try:
+            return await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            return self._versions.get(scope, 0)
+        finally:
+            with self._lock:
+                lst = self._waiters.get(scope)
+                if lst and waiter in lst:
+                    lst.remove(waiter)
+
+    def waiting(self) -> Dict[str, int]:
+        with self._lock:
+            return {k: len(v) for k, v in self._waiters.items()}
+
+
+def _resolve(fut: asyncio.Future, version: int) -> None:
+    if not fut.done():
+        fut.set_result(version)
+
+
+notifier = VersionNotifier()
+
+metrics.register(metrics.GaugeFunc(
+    "sync_wait_connections", "Long-poll connections waiting for a new version", ("scope",),
+    fn=lambda: {(k,): n for k, n in notifier.waiting().items()},
+))
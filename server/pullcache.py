@@ -0,0 +1,114 @@
+# File: server/pullcache.py
+"""
+pull 回應快取（/sync 只拉不推時）。
+
+同一使用者的多台裝置、或同一裝置重試，常以相同 lastVersion + 空 changes 呼叫 /sync，
+每次都重新查三張表、組出一模一樣的 SyncResponse。這裡快取「已編碼的 JSON bytes」：
+
+- key = (scope, lastVersion, serverVersion)；serverVersion 取自 notify.notifier 的已知版本。
+  版本號只增不減，同一個 serverVersion 下 version > lastVersion 的資料是固定的
+- 版本前進（notifier.publish）時立即清掉該 scope 的所有項目
+- LRU + 總位元組上限；單筆超過上限 1/4 的回應不快取（避免一筆完整同步擠掉所有項目）
+- 不經過本 process 的寫入（第二個 worker、從 .bak 還原 sync.db）不會通知 notifier：
+  命中前先以 external_change() 看 `PRAGMA data_version`（不讀任何資料頁），
+  有其他連線 commit 過就由呼叫端重新讀版本、更新 notifier 並清掉該 scope
+
+環境變數：
+  SYNC_PULL_CACHE_MB  快取上限（MB，預設 32；0 = 停用）
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from . import metrics
+
+PULL_CACHE_MB = float(os.getenv("SYNC_PULL_CACHE_MB", "32"))
+
+PULL_CACHE_REQUESTS = metrics.register(metrics.Counter(
+    "sync_pull_cache_requests_total", "Pull-only /sync cache lookups", ("result",),
+))
+PULL_CACHE_BYTES = metrics.register(metrics.GaugeFunc(
+    "sync_pull_cache_bytes", "Encoded pull responses held in the cache",
+))
+
+_Key = Tuple[str, int, int]
+
+
+class PullCache:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_entry = max_bytes // 4
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[_Key, Tuple[bytes, int]]" = OrderedDict()
+        self._by_scope: Dict[str, set] = {}
+        self.size = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, scope: str, last_version: int, server_version: Optional[int]) -> Optional[Tuple[bytes, int]]:
+        """回傳 (body, 資料列數)；serverVersion 未知（notifier 尚未初始化）時一律 miss。"""
+        if self.max_bytes <= 0:
+            return None
+        hit = None
+        if server_version is not None:
+            key = (scope, last_version, server_version)
+            with self._lock:
+                hit = self._items.get(key)
+                if hit is not None:
+                    self._items.move_to_end(key)
+        PULL_CACHE_REQUESTS.inc(1, "hit" if hit is not None else "miss")
+        return hit
+
+    def put(self, scope: str, last_version: int, server_version: int, body: bytes, rows: int) -> None:
+        if self.max_bytes <= 0 or len(body) > self.max_entry:
+            return
+        key = (scope, last_version, server_version)
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size -= len(old[0])
+            self._items[key] = (body, rows)
+            self._by_scope.setdefault(scope, set()).add(key)
+            self.size += len(body)
+            while self.size > self.max_bytes and self._items:
+                k, (b, _) = self._items.popitem(last=False)
+                self.size -= len(b)
+                self._by_scope.get(k[0], set()).discard(k)
+
+    def invalidate(self, scope: str) -> None:
+        with self._lock:
+            for k in self._by_scope.pop(scope, ()):
+                item = self._items.pop(k, None)
+                if item is not None:
+                    self.size -= len(item[0])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._by_scope.clear()
+            self.size = 0
+
+
+_DATA_VERSION_KEY = "pull_cache_data_version"
+
+
+def external_change(db) -> bool:
+    """
+    這條 DB 連線上次檢查之後，是否有其他連線 commit 過。
+    data_version 是每條連線各自的計數（自己的 commit 不會改變它），因此上次的值記在
+    pooled DBAPI 連線的 info 上；第一次看到的連線一律回傳 True。
+    本 process 的 commit queue 寫入也會讓其他連線看到變更，呼叫端多讀一次版本即可，結果一致。
+    """
+    conn = db.connection()
+    value = conn.exec_driver_sql("PRAGMA data_version").scalar()
+    info = conn.info
+    changed = info.get(_DATA_VERSION_KEY) != value
+    info[_DATA_VERSION_KEY] = value
+    return changed
+
+
+pull_cache = PullCache(int(PULL_CACHE_MB * 1024 * 1024))
+PULL_CACHE_BYTES.set_function(lambda: {(): pull_cache.size})
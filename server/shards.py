@@ -0,0 +1,275 @@
+# File: server/shards.py
+"""
+依使用者分片（sharding）的 SQLite 資料庫。
+
+單一 sync.db 代表整個服務只有一個 SQLite 寫入者。開啟分片後：
+- users / devices / tokens（auth）留在原本的 sync.db（directory DB）
+- 每位使用者的 sessions / exercises / sets 依 hash(user_id) 放到 shard-NNN.db
+- 每個 shard 各自有一條 single-writer commit queue（見 writer.py），寫入可平行
+- 開啟中的 shard engine 數量有上限（LRU），超過時關閉最久未用的連線池
+
+環境變數：
+  SYNC_SHARDS          分片數（預設 0 = 不分片，沿用單一 sync.db）
+  SYNC_SHARD_DIR       shard 檔案目錄（預設 ./shards）
+  SYNC_SHARD_POOL_MAX  同時開啟的 shard engine 上限（預設 8）
+
+既有 sync.db 拆分：
+  python -m server.shards split --source sync.db --count 8 --out-dir shards
+
+注意：版本號變成「每個 shard 各自遞增」，同一使用者的所有裝置都在同一個 shard，
+因此 pull 只會拿到同 shard 的變更。分片數一旦決定就不能直接修改（需重新拆分）。
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from . import metrics, models, slowlog  # noqa: F401  models：確保 ORM 表已註冊到 Base.metadata
+from .database import Base, SessionLocal, enable_sqlite_transactions
+from .migrate import run_migrations
+from .notify import GLOBAL_SCOPE
+from .writer import Writer, get_writer
+
+log = logging.getLogger("sync-api")
+
+SHARD_COUNT = int(os.getenv("SYNC_SHARDS", "0"))
+SHARD_DIR = os.getenv("SYNC_SHARD_DIR", "./shards")
+SHARD_POOL_MAX = int(os.getenv("SYNC_SHARD_POOL_MAX", "8"))
+
+DATA_TABLES = ("sessions", "exercises", "sets")
+MANIFEST = "shards.json"
+
+SHARD_ENGINES_OPEN = metrics.register(metrics.GaugeFunc(
+    "shard_engines_open", "Shard engines currently open in the LRU pool",
+))
+SHARD_EVICTIONS = metrics.register(metrics.Counter(
+    "shard_engine_evictions_total", "Shard engines closed by LRU eviction",
+))
+
+
+def enabled() -> bool:
+    return SHARD_COUNT > 0
+
+
+def shard_for(user_id: str, count: Optional[int] = None) -> int:
+    """穩定 hash（不受 PYTHONHASHSEED 影響），跨 process / 重啟結果一致。"""
+    n = SHARD_COUNT if count is None else count
+    digest = hashlib.blake2b(user_id.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % n
+
+
+def shard_path(idx: int, directory: str = SHARD_DIR) -> str:
+    return os.path.join(directory, f"shard-{idx:03d}.db")
+
+
+class ShardPool:
+    """shard engine 的 LRU pool；第一次開啟某 shard 時建表並套用 migrations。"""
+
+    def __init__(self, count: int, directory: str, max_open: int = SHARD_POOL_MAX):
+        self.count = count
+        self.directory = directory
+        self.max_open = max(1, max_open)
+        self._lock = threading.Lock()
+        self._open: "OrderedDict[int, sessionmaker]" = OrderedDict()
+        self._prepared: set = set()
+        self.evictions = 0
+
+    def check_manifest(self) -> None:
+        path = os.path.join(self.directory, MANIFEST)
+        if not os.path.exists(path):
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"count": self.count, "createdAt": int(time.time())}, f)
+            return
+        with open(path, "r", encoding="utf-8") as f:
+            found = json.load(f).get("count")
+        if found != self.count:
+            raise RuntimeError(
+                f"{path} was created for {found} shards but SYNC_SHARDS={self.count}; re-split the data first"
+            )
+
+    def sessionmaker(self, idx: int) -> sessionmaker:
+        with self._lock:
+            sm = self._open.get(idx)
+            if sm is not None:
+                self._open.move_to_end(idx)
+                return sm
+            engine = create_engine(
+                f"sqlite:///{shard_path(idx, self.directory)}",
+                connect_args={"check_same_thread": False},
+            )
+            enable_sqlite_transactions(engine)
+            if idx not in self._prepared:
+                Base.metadata.create_all(bind=engine)
+                run_migrations(engine)
+                self._prepared.add(idx)
+            metrics.instrument_engine(engine)
+            slowlog.instrument_engine(engine)
+            sm = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+            self._open[idx] = sm
+            while len(self._open) > self.max_open:
+                _, old = self._open.popitem(last=False)
+                # 只關閉閒置連線；仍在使用中的 session 歸還連線時才會真正關閉
+                old.kw["bind"].dispose()
+                self.evictions += 1
+                SHARD_EVICTIONS.inc()
+            return sm
+
+    def session(self, idx: int) -> Session:
+        return self.sessionmaker(idx)()
+
+    def open_count(self) -> int:
+        return len(self._open)
+
+    def dispose(self) -> None:
+        with self._lock:
+            for sm in self._open.values():
+                sm.kw["bind"].dispose()
+            self._open.clear()
+
+
+_pool: Optional[ShardPool] = None
+_writers: Dict[int, Writer] = {}
+_init_lock = threading.Lock()
+
+
+def get_pool() -> ShardPool:
+    global _pool
+    if _pool is None:
+        with _init_lock:
+            if _pool is None:
+                pool = ShardPool(SHARD_COUNT, SHARD_DIR)
+                pool.check_manifest()
+                SHARD_ENGINES_OPEN.set_function(lambda: {(): pool.open_count()})
+                _pool = pool
+    return _pool
+
+
+# ---------- 路由：依 user_id 選資料所在位置 ----------
+def scope_for(user_id: str) -> str:
+    """版本通知（notify）與快取使用的範圍鍵。"""
+    if not enabled():
+        return GLOBAL_SCOPE
+    return f"shard-{shard_for(user_id):03d}"
+
+
+@contextmanager
+def data_session(user_id: str, default: Optional[Session] = None) -> Iterator[Session]:
+    """
+    取得使用者資料所在的 Session。
+    不分片時直接沿用 default（通常是 request 的 get_db session），不另開連線。
+    """
+    if not enabled():
+        if default is not None:
+            yield default
+            return
+        db = SessionLocal()
+    else:
+        db = get_pool().session(shard_for(user_id))
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def writer_for(user_id: str) -> Writer:
+    """使用者資料的 commit queue；不分片時即為預設 writer。"""
+    if not enabled():
+        return get_writer()
+    idx = shard_for(user_id)
+    w = _writers.get(idx)
+    if w is None:
+        pool = get_pool()
+        with _init_lock:
+            w = _writers.get(idx)
+            if w is None:
+                w = _writers[idx] = Writer(lambda: pool.session(idx), name=f"sync-writer-{idx:03d}")
+    return w
+
+
+# ---------- 拆分既有 sync.db ----------
+def split(source: str, count: int, out_dir: str, batch: int = 5_000) -> Dict[int, int]:
+    """
+    將 source（單一 sync.db）的 sessions / exercises / sets 依使用者拆到 out_dir/shard-NNN.db。
+    - 列的擁有者以 deviceId → devices.user_id 判斷；找不到裝置的列依 deviceId 本身 hash
+    - 每個 shard 的 version_counter 寫入來源的全域最大版本，之後的寫入從此往上接續
+    - 來源檔不會被修改（auth 表仍由它提供）
+    """
+    if os.path.exists(os.path.join(out_dir, MANIFEST)):
+        raise RuntimeError(f"{out_dir} already contains shards; use an empty directory")
+    pool = ShardPool(count, out_dir, max_open=count)
+    pool.check_manifest()
+
+    src = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+    src.row_factory = sqlite3.Row
+    owner = {r["id"]: r["user_id"] for r in src.execute("SELECT id, user_id FROM devices")}
+    floor = max(
+        src.execute(f"SELECT COALESCE(MAX(version), 0) FROM {t}").fetchone()[0] for t in DATA_TABLES
+    )
+
+    conns = {}
+    for idx in range(count):
+        pool.sessionmaker(idx)  # 建表 + migrations
+        c = sqlite3.connect(shard_path(idx, out_dir))
+        c.execute("INSERT OR REPLACE INTO version_counter (id, current) VALUES (1, ?)", (floor,))
+        conns[idx] = c
+    pool.dispose()
+
+    counts = {idx: 0 for idx in range(count)}
+    for table in DATA_TABLES:
+        cur = src.execute(f"SELECT * FROM {table} ORDER BY rowid")
+        cols = [d[0] for d in cur.description]
+        col_list = ", ".join('"%s"' % c for c in cols)
+        marks = ", ".join("?" * len(cols))
+        sql = f"INSERT OR REPLACE INTO {table} ({col_list}) VALUES ({marks})"
+        while True:
+            rows = cur.fetchmany(batch)
+            if not rows:
+                break
+            buckets: Dict[int, list] = {}
+            for r in rows:
+                dev = r["deviceId"]
+                idx = shard_for(owner.get(dev, dev), count)
+                buckets.setdefault(idx, []).append(tuple(r))
+            for idx, items in buckets.items():
+                conns[idx].executemany(sql, items)
+                counts[idx] += len(items)
+    for c in conns.values():
+        c.commit()
+        c.close()
+    src.close()
+    return counts
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Workout Notes shard tools")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sp = sub.add_parser("split", help="split an existing sync.db into per-user shards")
+    sp.add_argument("--source", default="sync.db")
+    sp.add_argument("--count", type=int, required=True)
+    sp.add_argument("--out-dir", default=SHARD_DIR)
+    sp.add_argument("--batch", type=int, default=5_000)
+    args = ap.parse_args(argv)
+
+    t0 = time.perf_counter()
+    counts = split(args.source, args.count, args.out_dir, args.batch)
+    for idx, n in sorted(counts.items()):
+        print(f"shard-{idx:03d}: {n} rows")
+    print(f"done in {time.perf_counter() - t0:.1f}s → start the server with "
+          f"SYNC_SHARDS={args.count} SYNC_SHARD_DIR={args.out_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
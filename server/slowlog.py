@@ -0,0 +1,155 @@
+# File: server/slowlog.py
+"""
+慢查詢紀錄：engine 上的 cursor events 量每條 SQL 的時間，超過門檻即記下
+statement、綁定參數與 SQLite `EXPLAIN QUERY PLAN`，存在固定大小的 ring buffer。
+
+全表掃描另外彙總，方便直接看出缺 index 的查詢：plan 中的 `SCAN <table>`
+（含 `SCAN <table> USING INDEX ...`——只是借 index 排序，仍會走過整張表）。
+有用到 index 條件的是 `SEARCH`，不算在內。
+
+環境變數：
+  SLOW_QUERY_MS      門檻毫秒（預設 50；設為 0 代表記錄所有查詢，僅建議開發用）
+  SLOW_QUERY_BUFFER  ring buffer 筆數（預設 200）
+  SYNC_ADMIN_TOKEN   讀取 / 清空的管理 token（見 server/app.py）；未設定時端點回 404
+"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional
+
+log = logging.getLogger("sync-api")
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "50"))
+SLOW_QUERY_BUFFER = int(os.getenv("SLOW_QUERY_BUFFER", "200"))
+MAX_FULL_SCAN_STATEMENTS = 100
+MAX_PARAM_LEN = 64
+
+_EXPLAINABLE = ("SELECT", "UPDATE", "DELETE", "WITH")
+# SQLite ≥ 3.36: "SCAN sessions"；舊版: "SCAN TABLE sessions"
+_FULL_SCAN_RE = re.compile(r"^SCAN (?:TABLE )?(\w+)(?:\s+AS \w+)?(?:\s+USING (?:COVERING )?INDEX \w+)?$")
+# 參數可能含 bearer token，不能原樣輸出
+_SENSITIVE_TABLES = ("tokens",)
+
+_threshold_ms = SLOW_QUERY_MS
+_lock = threading.Lock()
+_records: Deque[Dict[str, Any]] = deque(maxlen=SLOW_QUERY_BUFFER)
+_full_scans: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+
+def explain_query_plan(dbapi_conn, statement: str, parameters=()) -> List[str]:
+    """回傳 EXPLAIN QUERY PLAN 的 detail 欄位（依樹狀深度縮排）。"""
+    cur = dbapi_conn.cursor()
+    try:
+        cur.execute("EXPLAIN QUERY PLAN " + statement, parameters or ())
+        rows = cur.fetchall()
+    finally:
+        cur.close()
+    depth: Dict[int, int] = {0: -1}
+    out = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        out.append("  " * depth[node_id] + detail)
+    return out
+
+
+def full_scan_tables(plan: List[str]) -> List[str]:
+    tables = []
+    for line in plan:
+        m = _FULL_SCAN_RE.match(line.strip())
+        if m:
+            tables.append(m.group(1))
+    return tables
+
+
+def _safe_params(statement: str, parameters) -> Any:
+    lowered = statement.lower()
+    if any(f" {t}" in lowered for t in _SENSITIVE_TABLES):
+        return "<redacted>"
+
+    def clip(v):
+        if isinstance(v, str) and len(v) > MAX_PARAM_LEN:
+            return v[:MAX_PARAM_LEN] + "…"
+        return v
+
+    if isinstance(parameters, dict):
+        return {k: clip(v) for k, v in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [clip(v) for v in parameters]
+    return parameters
+
+
+def _record(dbapi_conn, statement: str, parameters, elapsed_ms: float, executemany: bool) -> None:
+    plan: List[str] = []
+    if not executemany and statement.lstrip().upper().startswith(_EXPLAINABLE):
+        try:
+            plan = explain_query_plan(dbapi_conn, statement, parameters)
+        except Exception as e:  # EXPLAIN 失敗不影響原查詢
+            plan = [f"<explain failed: {e}>"]
+    scans = full_scan_tables(plan)
+    rec = {
+        "ts": time.time(),
+        "ms": round(elapsed_ms, 3),
+        "statement": statement,
+        "params": _safe_params(statement, parameters) if not executemany else "<executemany>",
+        "plan": plan,
+        "fullScan": scans,
+    }
+    with _lock:
+        _records.append(rec)
+        if scans:
+            agg = _full_scans.pop(statement, None) or {
+                "statement": statement, "tables": scans, "plan": plan,
+                "count": 0, "maxMs": 0.0, "totalMs": 0.0,
+            }
+            agg["count"] += 1
+            agg["maxMs"] = max(agg["maxMs"], rec["ms"])
+            agg["totalMs"] = round(agg["totalMs"] + rec["ms"], 3)
+            agg["lastTs"] = rec["ts"]
+            _full_scans[statement] = agg
+            while len(_full_scans) > MAX_FULL_SCAN_STATEMENTS:
+                _full_scans.popitem(last=False)
+    log.warning("slow query %.1fms%s: %s", elapsed_ms,
+                f" (full scan: {', '.join(scans)})" if scans else "", " ".join(statement.split()))
+
+
+def instrument_engine(engine, threshold_ms: Optional[float] = None) -> None:
+    from sqlalchemy import event
+
+    global _threshold_ms
+    if threshold_ms is not None:
+        _threshold_ms = threshold_ms
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        # 與 metrics.instrument_engine 相同：放在 execution context 上，失敗的敘述不留殘值
+        context._slowlog_t0 = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        t0 = getattr(context, "_slowlog_t0", None)
+        if t0 is None:
+            return
+        elapsed_ms = (time.perf_counter() - t0) * 1000.0
+        if elapsed_ms >= _threshold_ms:
+            _record(conn.connection, statement, parameters, elapsed_ms, executemany)
+
+
+def snapshot(limit: int = 50) -> Dict[str, Any]:
+    with _lock:
+        items = list(_records)[-limit:][::-1]
+        scans = sorted(_full_scans.values(), key=lambda x: x["totalMs"], reverse=True)
+    return {
+        "thresholdMs": _threshold_ms,
+        "buffered": len(_records),
+        "items": items,
+        "fullScans": scans,
+    }
+
+
+def reset() -> None:
+    with _lock:
+        _records.clear()
+        _full_scans.clear()
@@ -22,11 +22,14 @@ def get_current_version(db: Session) -> int:
     目前的 server 版本：
     取三張表（sessions / exercises / sets）version 欄位最大值，若皆為 None 則為 0。
     這樣不需要另建 counter 表，也能確保版本單調遞增。
+    version_counter 只當作下限：拆分 shard 後，各 shard 從全域版本往上接續，
+    客戶端手上的 lastVersion 不會大於新寫入的版本。
     """
     max_sess = db.query(func.max(models.Session.version)).scalar() or 0
     max_exer = db.query(func.max(models.Exercise.version)).scalar() or 0
     max_set = db.query(func.max(models.SetRecord.version)).scalar() or 0
-    return max(max_sess, max_exer, max_set)
+    floor = db.query(func.max(models.VersionCounter.current)).scalar() or 0
+    return max(max_sess, max_exer, max_set, floor)
 
 
 def bump_version(db: Session) -> int:
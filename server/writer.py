@@ -0,0 +1,204 @@
+# File: server/writer.py
+"""
+單一寫入者（single-writer）commit queue。
+
+SQLite 同時只允許一個寫入交易；每個 request thread 各自開交易搶鎖，
+並發 push 時就會出現 `database is locked` 與延遲尖峰。這裡把所有寫入
+（upsert / continue_latest_session / ensure_user_device_token）交給一條專用 thread：
+
+- group commit：一次取出佇列中最多 max_batch 個工作，在同一個交易內依序執行、只 commit 一次
+- 每個工作包在 SAVEPOINT 內，單一工作失敗只回滾自己，不影響同批其他工作
+  （engine 需經 database.enable_sqlite_transactions 設定；否則 pysqlite 的 SAVEPOINT 會自行開交易、
+  RELEASE 即提交，每個工作各自落盤）
+- 呼叫端拿到各自的 Future；結果在整批 commit 成功後才交付（確保已落盤）
+- FIFO 佇列維持到達順序；同一 key（裝置）同時在途的工作數有上限，避免單一裝置塞滿佇列
+- 佇列有界：滿了會等待 put_wait 秒，仍滿則丟出 WriteQueueFull（API 層轉成 503 + Retry-After）
+
+工作函式簽章為 fn(db, *args, **kwargs)，不得自行 commit，回傳值需為純資料（不要回傳 ORM 物件）。
+"""
+import contextvars
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from . import metrics
+
+log = logging.getLogger("sync-api")
+
+WRITE_QUEUE_MAX = int(os.getenv("SYNC_WRITE_QUEUE_MAX", "256"))
+WRITE_BATCH_MAX = int(os.getenv("SYNC_WRITE_BATCH_MAX", "32"))
+WRITE_PER_KEY_MAX = int(os.getenv("SYNC_WRITE_PER_KEY_MAX", "8"))
+WRITE_QUEUE_WAIT = float(os.getenv("SYNC_WRITE_QUEUE_WAIT", "1.0"))
+
+WRITE_BATCH_SIZE = metrics.register(metrics.Histogram(
+    "write_queue_batch_size", "Jobs committed per group-commit transaction", metrics.COUNT_BUCKETS,
+))
+WRITE_QUEUE_REJECTED = metrics.register(metrics.Counter(
+    "write_queue_rejected_total", "Write jobs rejected by backpressure", ("reason",),
+))
+WRITE_QUEUE_DEPTH = metrics.register(metrics.GaugeFunc(
+    "write_queue_depth", "Write jobs waiting in the commit queue", ("writer",),
+))
+
+
+class WriteQueueFull(Exception):
+    def __init__(self, reason: str, retry_after: int = 1):
+        super().__init__(f"write queue full ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+_Job = Tuple[Callable[..., Any], tuple, dict, Future, Optional[str], contextvars.Context]
+_STOP = object()
+
+
+class Writer:
+    def __init__(
+        self,
+        session_factory: Callable[[], Any],
+        name: str = "sync-writer",
+        max_queue: int = WRITE_QUEUE_MAX,
+        max_batch: int = WRITE_BATCH_MAX,
+        per_key_max: int = WRITE_PER_KEY_MAX,
+        put_wait: float = WRITE_QUEUE_WAIT,
+    ):
+        self.session_factory = session_factory
+        self.name = name
+        self.max_batch = max_batch
+        self.per_key_max = per_key_max
+        self.put_wait = put_wait
+        self._q: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, int] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    # ---------- 呼叫端 ----------
+    def submit(self, fn: Callable[..., Any], *args, key: Optional[str] = None, **kwargs) -> Future:
+        self._ensure_started()
+        if key is not None:
+            with self._lock:
+                n = self._inflight.get(key, 0)
+                if n >= self.per_key_max:
+                    WRITE_QUEUE_REJECTED.inc(1, "per_key")
+                    raise WriteQueueFull("too many pending writes for this device")
+                self._inflight[key] = n + 1
+        fut: Future = Future()
+        try:
+            # 帶上呼叫端的 contextvars：工作內的 SQL 才會計入該 request 的 metrics
+            self._q.put((fn, args, kwargs, fut, key, contextvars.copy_context()), timeout=self.put_wait)
+        except queue.Full:
+            self._release(key)
+            WRITE_QUEUE_REJECTED.inc(1, "queue_full")
+            raise WriteQueueFull("commit queue is full")
+        return fut
+
+    def call(self, fn: Callable[..., Any], *args, key: Optional[str] = None, **kwargs) -> Any:
+        """submit 並等待結果（同步路由在 threadpool 內呼叫）。"""
+        return self.submit(fn, *args, key=key, **kwargs).result()
+
+    def depth(self) -> int:
+        return self._q.qsize()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        t = self._thread
+        if t is None:
+            return
+        self._q.put(_STOP)
+        t.join(timeout)
+        self._thread = None
+
+    # ---------- writer thread ----------
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _release(self, key: Optional[str]) -> None:
+        if key is None:
+            return
+        with self._lock:
+            n = self._inflight.get(key, 0) - 1
+            if n > 0:
+                self._inflight[key] = n
+            else:
+                self._inflight.pop(key, None)
+
+    def _run(self) -> None:
+        while True:
+            job = self._q.get()
+            if job is _STOP:
+                return
+            batch: List[_Job] = [job]
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    nxt = self._q.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is _STOP:
+                    stop = True
+                    break
+                batch.append(nxt)
+            self._commit_batch(batch)
+            if stop:
+                return
+
+    def _commit_batch(self, batch: List[_Job]) -> None:
+        outcomes: List[Tuple[Future, Any, Optional[BaseException]]] = []
+        db = self.session_factory()
+        try:
+            for fn, args, kwargs, fut, _, ctx in batch:
+                if not fut.set_running_or_notify_cancel():
+                    continue
+                sp = db.begin_nested()
+                try:
+                    res = ctx.run(fn, db, *args, **kwargs)
+                    sp.commit()
+                    outcomes.append((fut, res, None))
+                except Exception as e:
+                    sp.rollback()
+                    outcomes.append((fut, None, e))
+            db.commit()
+        except Exception as e:
+            # commit 本身失敗：整批都沒寫進去，所有尚未失敗的工作一起回報錯誤
+            log.exception("%s: group commit of %d jobs failed", self.name, len(batch))
+            db.rollback()
+            own = {id(fut): err for fut, _, err in outcomes}
+            outcomes = [
+                (fut, None, own.get(id(fut)) or e)
+                for _, _, _, fut, _, _ in batch
+                if not fut.cancelled()
+            ]
+        finally:
+            db.close()
+            for *_, key, _ in batch:
+                self._release(key)
+
+        WRITE_BATCH_SIZE.observe(len(batch))
+        for fut, res, err in outcomes:
+            if err is not None:
+                fut.set_exception(err)
+            else:
+                fut.set_result(res)
+
+
+_default: Optional[Writer] = None
+_default_lock = threading.Lock()
+
+
+def get_writer() -> Writer:
+    """預設 writer（綁定 server.database.SessionLocal），第一次呼叫時建立。"""
+    global _default
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                from .database import SessionLocal
+                _default = Writer(SessionLocal)
+                WRITE_QUEUE_DEPTH.set_function(lambda: {(_default.name,): _default.depth()})
+    return _default
@@ -0,0 +1,9 @@
+# File: tests/conftest.py
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# server.database 在 import 時建立 engine；測試一律用暫存 DB，不碰專案根目錄的 sync.db
+os.environ.setdefault("SYNC_DATABASE_URL", "sqlite:///" + os.path.join(ROOT, ".pytest-sync.db"))
@@ -0,0 +1,41 @@
+# File: tests/test_admission.py
+"""准入控制（server/admission.py）：偽造 deviceId 不能扣到別人的額度；格式錯的 body 交給路由回 422。"""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from server import admission
+from server.app import create_app
+
+
+@pytest.fixture()
+def client(monkeypatch):
+    monkeypatch.setattr(admission, "ADMIT_BURST", 5.0)
+    monkeypatch.setattr(admission, "ADMIT_RATE", 0.01)
+    inner = FastAPI()
+    inner.post("/sync")(lambda: {"ok": True})
+    verified = {("good-token", "victim"): "user-1"}
+    app = admission.AdmissionMiddleware(inner, enabled=True, verify=lambda t, d: verified.get((t, d)))
+    return TestClient(app)
+
+
+def test_forged_device_id_does_not_drain_victim_bucket(client):
+    forged = {"deviceId": "victim", "token": "forged", "lastVersion": 1}
+    codes = [client.post("/sync", json=forged).status_code for _ in range(6)]
+    assert codes[:5] == [200] * 5 and codes[5] == 429
+    # 偽造者耗盡的是自己 IP 的 bucket；受害裝置帶著已驗證的 token 仍可通過
+    ok = client.post("/sync", json={"deviceId": "victim", "token": "good-token", "lastVersion": 1})
+    assert ok.status_code == 200
+
+
+@pytest.mark.parametrize("changes", [{"sets": 5}, {"sessions": "x", "sets": None}, ["not", "a", "dict"]])
+def test_classify_ignores_malformed_changes(changes):
+    assert admission.classify("/sync", {"changes": changes, "lastVersion": 3}, {}) == ("pull", admission.NORMAL)
+
+
+def test_malformed_changes_reach_route_validation(monkeypatch):
+    monkeypatch.setattr(admission, "ADMIT_ENABLED", True)
+    r = TestClient(create_app()).post(
+        "/sync", json={"deviceId": "d", "token": "t", "lastVersion": 0, "changes": {"sets": 5}},
+    )
+    assert r.status_code == 422
@@ -0,0 +1,38 @@
+# File: tests/test_diagnostics.py
+"""/diagnostics/slow-queries：未設定 SYNC_ADMIN_TOKEN 時不存在，設定後需帶 X-Admin-Token；清空只能用 POST。"""
+import pytest
+from fastapi.testclient import TestClient
+
+import server.app as app_module
+from server import slowlog
+
+
+@pytest.fixture()
+def client():
+    return TestClient(app_module.create_app())
+
+
+def test_hidden_without_admin_token(client, monkeypatch):
+    monkeypatch.setattr(app_module, "ADMIN_TOKEN", "")
+    assert client.get("/diagnostics/slow-queries").status_code == 404
+    assert client.post("/diagnostics/slow-queries/reset", headers={"X-Admin-Token": ""}).status_code == 404
+
+
+def test_requires_matching_admin_token(client, monkeypatch):
+    monkeypatch.setattr(app_module, "ADMIN_TOKEN", "s3cret")
+    assert client.get("/diagnostics/slow-queries").status_code == 403
+    assert client.get("/diagnostics/slow-queries", headers={"X-Admin-Token": "nope"}).status_code == 403
+    r = client.get("/diagnostics/slow-queries", headers={"X-Admin-Token": "s3cret"})
+    assert r.status_code == 200
+
+
+def test_reset_is_post_only(client, monkeypatch):
+    monkeypatch.setattr(app_module, "ADMIN_TOKEN", "s3cret")
+    called = []
+    monkeypatch.setattr(slowlog, "reset", lambda: called.append(True))
+    headers = {"X-Admin-Token": "s3cret"}
+    client.get("/diagnostics/slow-queries?reset=true", headers=headers)
+    assert client.get("/diagnostics/slow-queries/reset", headers=headers).status_code == 405
+    assert not called
+    assert client.post("/diagnostics/slow-queries/reset", headers=headers).json() == {"ok": True}
+    assert called == [True]
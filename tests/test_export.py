@@ -0,0 +1,33 @@
+# File: tests/test_export.py
+"""歷史紀錄匯出（server/export.py）的編碼。"""
+import gzip
+import io
+import json
+
+import pytest
+
+from server import export
+
+
+def _row(weight, rpe, reps=8):
+    return ("2024-01-01", "s1", 1704067200000, None, "ended", "z1", "e1", "Bench", "upper",
+            weight, reps, "kg", rpe, 1704067200000)
+
+
+BATCHES = [[_row(52.5, 7.5), _row(60, None)], [_row(42.5, 8, reps=5)]]
+
+
+def test_jsonl_keeps_fractional_values():
+    body = gzip.decompress(b"".join(export.encode(iter(BATCHES), "jsonl", gzip=True)))
+    rows = [json.loads(line) for line in body.decode("utf-8").splitlines()]
+    assert [(r["weight"], r["rpe"]) for r in rows] == [(52.5, 7.5), (60, None), (42.5, 8)]
+
+
+def test_parquet_round_trip_with_fractional_values():
+    pq = pytest.importorskip("pyarrow.parquet")
+    body = b"".join(export.encode(iter(BATCHES), "parquet"))
+    table = pq.read_table(io.BytesIO(body))
+    assert table.column_names == list(export.HISTORY_COLUMNS)
+    assert table.column("weight").to_pylist() == [52.5, 60.0, 42.5]
+    assert table.column("rpe").to_pylist() == [7.5, None, 8.0]
+    assert table.column("reps").to_pylist() == [8, 8, 5]
@@ -0,0 +1,94 @@
+# File: tests/test_hiit_batch.py
+"""HIIT 寫入路由：並行的批次 / 單筆修改同一筆時，不能以舊值互相覆寫或讓已刪除的項目復活。"""
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from server.hiit import router
+
+
+class _SlowStore(dict):
+    """get 時等另一個寫入也來讀（最多 1 秒），沒有鎖保護時兩邊必定讀到同一份舊值。"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.barrier = threading.Barrier(2, timeout=1.0)
+
+    def get(self, key, default=None):
+        try:
+            self.barrier.wait()
+        except threading.BrokenBarrierError:
+            pass  # 另一批被鎖擋在外面：正常情況
+        return super().get(key, default)
+
+    def update(self, *args, **kwargs):
+        # 批次寫回前稍等，沒有鎖保護時並行的單筆修改必定先落地、再被批次的舊值蓋掉
+        time.sleep(0.05)
+        super().update(*args, **kwargs)
+
+
+@pytest.fixture()
+def store(monkeypatch):
+    s = _SlowStore(ex1=router.HiitExercise(id="ex1", name="Squat", primaryCategory="lower").model_dump())
+    monkeypatch.setitem(router.DB, "exercises", s)
+    router._validate_all(router.HiitExerciseBatchUpdate, [])  # 先建好 TypeAdapter，兩批才會同時走到 get
+    return s
+
+
+def _quietly(fn, *args, **kwargs):
+    """單筆路由找不到項目時會丟 404；誰先拿到鎖不一定，這裡只關心最後的狀態。"""
+    def run():
+        try:
+            fn(*args, **kwargs)
+        except HTTPException:
+            pass
+    return run
+
+
+def _run_concurrently(*calls):
+    threads = [threading.Thread(target=c) for c in calls]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def test_concurrent_batch_updates_keep_both_changes(store):
+    def update(field, value):
+        body = router.BatchItems(items=[{"id": "ex1", field: value}])
+        return lambda: router._batch_update("exercises", router.HiitExerciseBatchUpdate, router.HiitExercise, body)
+
+    _run_concurrently(update("name", "Jump Squat"), update("cue", "knees out"))
+    assert store["ex1"]["name"] == "Jump Squat"
+    assert store["ex1"]["cue"] == "knees out"
+
+
+def test_batch_update_does_not_resurrect_concurrent_delete(store):
+    upd = router.BatchItems(items=[{"id": "ex1", "name": "Jump Squat"}])
+    _run_concurrently(
+        lambda: router._batch_flag("exercises", router.BatchIds(ids=["ex1"]), delete=True),
+        lambda: router._batch_update("exercises", router.HiitExerciseBatchUpdate, router.HiitExercise, upd),
+    )
+    # 不論誰先拿到鎖，軟刪除都不能被另一批的舊值蓋掉
+    assert store["ex1"]["deletedAt"] is not None
+
+
+def _batch_rename(name):
+    body = router.BatchItems(items=[{"id": "ex1", "name": name}])
+    return lambda: router._batch_update("exercises", router.HiitExerciseBatchUpdate, router.HiitExercise, body)
+
+
+def test_batch_update_does_not_resurrect_single_hard_delete(store):
+    _run_concurrently(_quietly(router.delete_exercise, "ex1", hard=True), _batch_rename("Jump Squat"))
+    assert "ex1" not in store
+
+
+def test_batch_update_keeps_concurrent_single_update(store):
+    _run_concurrently(
+        _quietly(router.update_exercise, "ex1", router.HiitExerciseUpdate(cue="knees out")),
+        _batch_rename("Jump Squat"),
+    )
+    assert store["ex1"]["name"] == "Jump Squat"
+    assert store["ex1"]["cue"] == "knees out"
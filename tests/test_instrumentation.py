@@ -0,0 +1,31 @@
+# File: tests/test_instrumentation.py
+"""SQL 計時（metrics / slowlog 的 cursor events）：失敗的敘述不能在 pooled 連線上留下計時殘值。"""
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from server import metrics, slowlog
+
+
+@pytest.fixture()
+def engine(tmp_path, monkeypatch):
+    monkeypatch.setattr(slowlog, "_threshold_ms", slowlog._threshold_ms)  # instrument_engine 會改全域門檻
+    eng = create_engine(f"sqlite:///{tmp_path / 'instr.db'}", pool_size=1, max_overflow=0)
+    metrics.instrument_engine(eng)
+    slowlog.instrument_engine(eng, threshold_ms=0)
+    yield eng
+    eng.dispose()
+
+
+def test_failed_statements_leave_no_timing_state(engine):
+    for _ in range(5):
+        with engine.connect() as conn, pytest.raises(OperationalError):
+            conn.execute(text("SELECT * FROM no_such_table"))
+
+    before = metrics.SQL_STATEMENTS._values.get((), 0.0)
+    slowlog.reset()
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT 1")).scalar() == 1
+        assert not [k for k, v in conn.info.items() if isinstance(v, list)]
+    assert metrics.SQL_STATEMENTS._values.get((), 0.0) == before + 1
+    assert [r["statement"] for r in slowlog.snapshot()["items"]] == ["SELECT 1"]
@@ -0,0 +1,121 @@
+# File: tests/test_migrate.py
+"""
+migration runner 與 query plan：
+- 不套用 runner 之前的 001，也不建沒有查詢使用的 index
+- 在合成資料上套用 migrations 後，熱點查詢須走到 server/migrations/ 管理的 index，且沒有全表掃描
+  （statement 形狀與 crud.py 相同；planner 依 ANALYZE 統計選 index，資料量太小時會改走全表掃描，
+  因此用 benchmarks.datagen 最小的 10k 規模）
+"""
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine, desc, select
+
+from benchmarks.datagen import build_database
+from server import models
+from server.database import Base
+from server.migrate import FIRST_MANAGED_VERSION, run_migrations
+from server.slowlog import explain_query_plan, full_scan_tables
+
+
+def _schema(path):
+    con = sqlite3.connect(path)
+    try:
+        return {name: kind for name, kind in con.execute("SELECT name, type FROM sqlite_master")}
+    finally:
+        con.close()
+
+
+def test_fresh_db_skips_legacy_hiit_tables(tmp_path):
+    path = str(tmp_path / "fresh.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    applied = run_migrations(engine)
+    engine.dispose()
+
+    assert all(int(fn.split("_", 1)[0]) >= FIRST_MANAGED_VERSION for fn in applied)
+    schema = _schema(path)
+    assert not [n for n in schema if n.startswith("hiit_")]
+    assert not [n for n in schema if n.endswith("_device_version")]
+    assert "ix_sets_version" in schema
+
+
+# ---------- query plans ----------
+def _hot_queries(ds):
+    """(名稱, SQLAlchemy statement, 預期 index)。"""
+    user_id, device_id, _ = ds.devices[0]
+    return [
+        (
+            "continue_latest_session / recent sessions",
+            select(models.Session)
+            .where(models.Session.deviceId == device_id)
+            .where(models.Session.deletedAt.is_(None))
+            .order_by(desc(models.Session.updatedAt))
+            .limit(5),
+            "ix_sessions_device_updated",
+        ),
+        (
+            "get_recent_exercises sets by session",
+            select(models.SetRecord)
+            .where(models.SetRecord.sessionId.in_(["a", "b", "c", "d", "e"]))
+            .where(models.SetRecord.deletedAt.is_(None))
+            .order_by(desc(models.SetRecord.updatedAt)),
+            "ix_sets_session_updated",
+        ),
+        (
+            "get_recent_exercises exercises by id",
+            select(models.Exercise).where(models.Exercise.id.in_(ds.exercise_ids[:5])),
+            "ix_exercises_id",
+        ),
+        (
+            "get_token_by_device",
+            select(models.Token).where(models.Token.device_id == device_id).limit(1),
+            "ix_tokens_device_id",
+        ),
+        (
+            "devices of user",
+            select(models.Device).where(models.Device.user_id == user_id),
+            "ix_devices_user_id",
+        ),
+        (
+            "export/history sessions batch",
+            select(models.Session.startedAt, models.Session.id)
+            .where(models.Session.deviceId.in_([d for _, d, _ in ds.devices[:2]]))
+            .where(models.Session.deletedAt.is_(None))
+            .where(models.Session.startedAt >= 0)
+            .order_by(models.Session.startedAt, models.Session.id)
+            .limit(200),
+            "ix_sessions_device_started",
+        ),
+        (
+            "list_changes_since sets",
+            select(models.SetRecord).where(models.SetRecord.version > ds.max_version - 100),
+            "ix_sets_version",
+        ),
+    ]
+
+
+@pytest.fixture(scope="module")
+def plan_db(tmp_path_factory):
+    ds = build_database(str(tmp_path_factory.mktemp("qplan") / "plan.db"), "10k")
+    engine = create_engine(ds.url)
+    run_migrations(engine)
+    raw = engine.raw_connection()
+    yield ds, engine, raw.driver_connection
+    raw.close()
+    engine.dispose()
+
+
+def _explain(engine, dbapi_conn, stmt):
+    compiled = stmt.compile(dialect=engine.dialect, compile_kwargs={"render_postcompile": True})
+    return explain_query_plan(dbapi_conn, str(compiled), [compiled.params[k] for k in compiled.positiontup])
+
+
+def test_hot_queries_use_managed_indexes(plan_db):
+    ds, engine, conn = plan_db
+    failures = []
+    for name, stmt, index in _hot_queries(ds):
+        plan = _explain(engine, conn, stmt)
+        if not any(index in line for line in plan) or full_scan_tables(plan):
+            failures.append(f"{name}: expected {index}, got {plan}")
+    assert not failures
@@ -0,0 +1,37 @@
+# File: tests/test_pullcache.py
+"""pull 回應快取：本 process 之外的寫入（另一個 worker、還原備份）也要讓快取失效。"""
+import sqlite3
+import uuid
+
+from fastapi.testclient import TestClient
+
+from server.app import create_app
+from server.database import engine
+from server.pullcache import pull_cache
+
+
+def test_external_write_is_not_hidden_by_cache():
+    with TestClient(create_app()) as client:
+        reg = client.post("/auth/register-device", json={}).json()
+        auth = {"deviceId": reg["deviceId"], "token": reg["token"]}
+        version = client.post("/sync", json={**auth, "lastVersion": 0}).json()["serverVersion"]
+
+        pull = {**auth, "lastVersion": version}
+        first = client.post("/sync", json=pull).json()
+        assert first["changes"]["sessions"] == []
+        assert pull_cache.size > 0
+
+        # 直接以另一條連線寫入，不經過 notifier（等同另一個 worker 或還原 sync.db）
+        sid = str(uuid.uuid4())
+        con = sqlite3.connect(engine.url.database)
+        con.execute(
+            'INSERT INTO sessions (id, "startedAt", "updatedAt", "deviceId", version, status)'
+            " VALUES (?, 0, 0, ?, ?, 'in_progress')",
+            (sid, reg["deviceId"], version + 1),
+        )
+        con.commit()
+        con.close()
+
+        after = client.post("/sync", json=pull).json()
+        assert after["serverVersion"] == version + 1
+        assert [s["id"] for s in after["changes"]["sessions"]] == [sid]
@@ -0,0 +1,43 @@
+# File: tests/test_startup.py
+"""冷啟動：import server.app 不碰 DB、不載 seed；這些工作只在 lifespan 內進行。"""
+import json
+import os
+import subprocess
+import sys
+
+from fastapi.testclient import TestClient
+
+from server import app as app_module
+from server.hiit import router as hiit_router
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_PROBE = """
+import json, os, sys
+import server.app
+from server.hiit.router import DB
+print(json.dumps({"db_exists": os.path.exists(sys.argv[1]), "exercises": len(DB["exercises"])}))
+"""
+
+
+def test_import_does_not_touch_db_or_seed(tmp_path):
+    db_path = str(tmp_path / "import-only.db")
+    env = dict(os.environ, SYNC_DATABASE_URL=f"sqlite:///{db_path}",
+               PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    out = subprocess.run([sys.executable, "-c", _PROBE, db_path], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True)
+    probe = json.loads(out.stdout.strip().splitlines()[-1])
+    assert probe == {"db_exists": False, "exercises": 0}
+
+
+def test_lifespan_runs_every_startup_task(monkeypatch):
+    monkeypatch.setitem(hiit_router.DB, "exercises", {})
+    monkeypatch.setattr(app_module, "STARTUP", {})
+    with TestClient(app_module.create_app()) as client:
+        assert client.get("/health").status_code == 200
+        phases = client.get("/diagnostics/startup").json()["phases"]
+    for name, _ in app_module.STARTUP_TASKS:
+        assert name in app_module.STARTUP
+        assert name in phases
+    assert "lifespan" in app_module.STARTUP
+    assert hiit_router.DB["exercises"]
@@ -0,0 +1,104 @@
+# File: tests/test_writer.py
+"""commit queue（server/writer.py）：同批工作只在整批 commit 後才對其他連線可見。"""
+import sqlite3
+import threading
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from server import models  # noqa: F401  註冊 ORM 表
+from server.crud import ensure_user_device_token
+from server.database import Base, enable_sqlite_transactions
+from server.writer import Writer
+
+
+@pytest.fixture()
+def db_path(tmp_path):
+    return str(tmp_path / "writer.db")
+
+
+@pytest.fixture()
+def writer(db_path):
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+    enable_sqlite_transactions(engine)
+    Base.metadata.create_all(bind=engine)
+    w = Writer(sessionmaker(bind=engine, autoflush=False, autocommit=False), name="test-writer")
+    yield w
+    w.stop()
+    engine.dispose()
+
+
+def _users(db_path):
+    con = sqlite3.connect(db_path)
+    try:
+        return {r[0] for r in con.execute("SELECT id FROM users")}
+    finally:
+        con.close()
+
+
+def _add_user(db, user_id):
+    ensure_user_device_token(db, user_id, f"dev-{user_id}", f"tok-{user_id}", commit=False)
+
+
+def _queue_batch(writer, jobs):
+    """先用一個工作卡住 writer，讓 jobs 排進同一批 group commit。"""
+    release = threading.Event()
+    started = threading.Event()
+
+    def blocker(db):
+        started.set()
+        release.wait(5)
+
+    first = writer.submit(blocker)
+    assert started.wait(5)
+    futures = [writer.submit(fn, *args) for fn, *args in jobs]
+    release.set()
+    first.result(5)
+    return futures
+
+
+def test_batch_invisible_until_group_commit(writer, db_path):
+    in_last = threading.Event()
+    checked = threading.Event()
+    seen_during_batch = []
+
+    def last_job(db):
+        in_last.set()
+        checked.wait(5)
+
+    futures = _queue_batch(writer, [(_add_user, "u0"), (_add_user, "u1"), (last_job,)])
+    assert in_last.wait(5)
+    # u0 / u1 已在同一交易內寫入，但整批尚未 commit：其他連線不應看到
+    seen_during_batch.extend(_users(db_path))
+    checked.set()
+    for f in futures:
+        f.result(5)
+
+    assert seen_during_batch == []
+    assert _users(db_path) == {"u0", "u1"}
+
+
+def test_failed_job_rolls_back_only_itself(writer, db_path):
+    def failing(db):
+        _add_user(db, "bad")
+        raise RuntimeError("boom")
+
+    futures = _queue_batch(writer, [(_add_user, "a"), (failing,), (_add_user, "b")])
+    futures[0].result(5)
+    with pytest.raises(RuntimeError):
+        futures[1].result(5)
+    futures[2].result(5)
+    assert _users(db_path) == {"a", "b"}
+
+
+def test_job_runs_in_callers_context(writer):
+    import contextvars
+
+    var = contextvars.ContextVar("test_request", default=None)
+    token = var.set("request-1")
+    try:
+        assert writer.call(lambda db: var.get()) == "request-1"
+    finally:
+        var.reset(token)
+    assert writer.call(lambda db: var.get()) is None